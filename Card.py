@@ -6,10 +6,20 @@ Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
 
 import arcade
 
+import rankings
+
 ranks = {"A": 1, "2": 2, "3": 3, "4": 4, "5": 5, "6": 6,
          "7": 7, "8": 8, "9": 9, "10": 10, "J": 11, "Q": 12, "K": 13}
 
+# (suit, value) for every integer card code, so binary frames never build strings to parse
+CODE_FACES = [None] * 52
+for _value, _number in ranks.items():
+    for _suit in rankings.SUITS:
+        CODE_FACES[rankings.encode_card(_suit, _number)] = (_suit, _value)
+
 
+# Client-only sprite for a card; the server deals integer card codes (see deck.py)
+# and sends them as codes (msgpack) or "<value> of <suit>" strings (JSON), see wire.py
 class Card(arcade.Sprite):
     def __init__(self, suit, value, scale=1):
         self.suit = suit
@@ -22,6 +32,23 @@ class Card(arcade.Sprite):
         # call parent
         super().__init__(self.image_file_name, scale, hit_box_algorithm="None")
 
+    @classmethod
+    def from_name(cls, card_str, scale=1):
+        value, _, suit = card_str.partition(" of ")
+        return cls(suit, value, scale)
+
+    @classmethod
+    def from_code(cls, code, scale=1):
+        suit, value = CODE_FACES[code]
+        return cls(suit, value, scale)
+
+    # A card as it arrived from the server, in either wire encoding
+    @classmethod
+    def from_wire(cls, card, scale=1):
+        if isinstance(card, int):
+            return cls.from_code(card, scale)
+        return cls.from_name(card, scale)
+
     def __str__(self):
         return f"{self.value} of {self.suit}"
 
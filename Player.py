@@ -3,33 +3,124 @@ CS 3050 Poker Game - Player.py
 Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
 """
 
+from array import array
+
+import rankings
+
+TIME_BANK = 30.0
+
+
+# Per-seat betting state for a whole table as flat arrays indexed by seat index: the
+# fields every betting scan reads (chips, this street's bet, folded, acted) sit next to
+# each other instead of in one object per player.  A Player reads and writes its own
+# slot through properties.
+#
+# acted holds the epoch a seat last acted in, so clearing everyone's flag is one
+# increment.  after / before link the seats still able to bet into a ring in turn order
+# and position is each seat's place in the turn order (-1 when not dealt in); PokerGame
+# maintains them (see rebuild_betting_state).
+class Seats:
+    __slots__ = ("chips", "bets", "folded", "acted", "epoch", "after", "before", "position")
+
+    def __init__(self, size):
+        self.chips = array("i", bytes(4 * size))
+        self.bets = array("i", bytes(4 * size))  # chips put in on the current street
+        self.folded = bytearray(size)
+        self.acted = array("q", bytes(8 * size))
+        self.epoch = 1
+        self.after = array("h", [-1] * size)
+        self.before = array("h", [-1] * size)
+        self.position = array("h", [-1] * size)
+
+    def clear(self, index):
+        self.chips[index] = 0
+        self.bets[index] = 0
+        self.folded[index] = 0
+        self.acted[index] = 0
+        self.position[index] = -1
+
+    # nobody has bet or acted yet
+    def new_street(self):
+        self.bets = array("i", bytes(4 * len(self.bets)))
+        self.epoch += 1
+
+    def clear_acted(self):
+        self.epoch += 1
+
+    def grow(self, size):
+        extra = size - len(self.chips)
+        self.chips.extend([0] * extra)
+        self.bets.extend([0] * extra)
+        self.folded.extend(bytes(extra))
+        self.acted.extend([0] * extra)
+        self.after.extend([-1] * extra)
+        self.before.extend([-1] * extra)
+        self.position.extend([-1] * extra)
+
 
 class Player:
-    def __init__(self, name, uuid, seat_position, seat_position_flag, is_ready):
+    __slots__ = ("name", "uuid", "seat_position", "hand", "hand_rank", "card_mask", "hand_strength",
+                 "seat_position_flag", "current_bet", "is_ready", "time_bank", "seats", "index")
+
+    # seats / index: the table's Seats and this player's slot in them (PokerGame.add_player
+    # picks one); a player on their own gets a one seat table
+    def __init__(self, name, uuid, seat_position, seat_position_flag, is_ready, seats=None, index=0):
+        self.seats = seats if seats is not None else Seats(1)
+        self.index = index
         self.name = name
         self.uuid = uuid
         self.chips = 1000
         self.seat_position = seat_position
-        self.hand = []  # List of Cards of length 2
+        self.hand = []  # List of card codes of length 2
         self.hand_rank = (1,0)
+        # Incremental evaluation state: the hole cards plus the board dealt so far as one
+        # card mask (four 13 bit suit masks, see rankings.CARD_BITS), and its strength
+        self.card_mask = 0
+        self.hand_strength = 0
         self.seat_position_flag = seat_position_flag  # one of Dealer, Big Blind, Little Blind
         self.folded = False
         self.current_bet = 0
         self.is_ready = is_ready
 
         self.acted_this_round = False
+        # seconds of extra thinking time once the action clock runs out, kept across hands
+        self.time_bank = TIME_BANK
+
+    @property
+    def chips(self):
+        return self.seats.chips[self.index]
+
+    @chips.setter
+    def chips(self, value):
+        self.seats.chips[self.index] = value
+
+    @property
+    def folded(self):
+        return bool(self.seats.folded[self.index])
+
+    @folded.setter
+    def folded(self, value):
+        self.seats.folded[self.index] = bool(value)
+
+    @property
+    def acted_this_round(self):
+        return self.seats.acted[self.index] == self.seats.epoch
+
+    @acted_this_round.setter
+    def acted_this_round(self, value):
+        self.seats.acted[self.index] = self.seats.epoch if value else 0
 
     # returns a dictionary of the player data to pass around as json (cant pass regular python objects)
     # we should keep our eye on this to make sure that the dictionary is
     # updated correctly (when we eventually access it in a more involved way)
+    # Public view of the player, broadcast to the whole table: hole cards (and the rank
+    # they make) only ever go to their owner through a private frame event
     def to_dict(self):
         return {
             'name': self.name,
             'uuid': self.uuid,
             'money_count': self.chips,
             'seat_position': self.seat_position,
-            'hand': self.hand,
-            'hand_rank': self.hand_rank,
             'seat_position_flag': self.seat_position_flag,
             'folded': self.folded,
             'current_bet': self.current_bet
@@ -37,6 +128,11 @@ class Player:
 
     def receive_card(self, card):
         self.hand += card
+        self.card_mask |= rankings.card_mask(card)
+
+    # community cards only need to be folded into the mask
+    def receive_board_cards(self, board_mask):
+        self.card_mask |= board_mask
 
     def make_bet(self, current_bet):
         self.chips -= current_bet
@@ -45,11 +141,18 @@ class Player:
     def set_hand_rank(self, hand_rank):
         self.hand_rank = hand_rank
 
+    # re-rank from the maintained mask, no need to rebuild the hand + board list
+    def update_hand_rank(self):
+        self.hand_strength = rankings.evaluate_card_mask(self.card_mask)
+        self.hand_rank = rankings.strength_to_rank(self.hand_strength)
+
     def receive_money(self, current_bet):
         self.chips += current_bet
 
     def reset_for_round(self):
         self.hand = []
+        self.card_mask = 0
+        self.hand_strength = 0
         self.current_bet = 0
         self.folded = False
         self.acted_this_round = False
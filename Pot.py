@@ -1,12 +1,18 @@
 class Pot:
+    __slots__ = ("amount", "contributions")
+
     def __init__(self):
         self.amount = 0
+        self.contributions = {}  # uuid -> chips put in over the whole hand
 
-    def add_to_pot(self, bet_amount):
+    def add_to_pot(self, bet_amount, uuid=None):
         self.amount += bet_amount
+        if uuid is not None:
+            self.contributions[uuid] = self.contributions.get(uuid, 0) + bet_amount
 
     def clear_pot(self):
         self.amount = 0
+        self.contributions = {}
 
     def payout_single(self, player):
         player.receive_money(self.amount)
@@ -27,3 +33,78 @@ class Pot:
             players[0].receive_money(remainder)
 
         self.clear_pot()
+
+    # Splits the contributions into a main pot and side pots: one layer per distinct
+    # contribution level, each contested by the players still in who put in at least that much.
+    # Returns [(amount, level), ...] from the main pot up.
+    def side_pots(self):
+        pots = []
+        previous_level = 0
+        remaining = len(self.contributions)
+        for level in sorted(self.contributions.values()):
+            if level > previous_level:
+                pots.append(((level - previous_level) * remaining, level))
+                previous_level = level
+            remaining -= 1
+
+        # chips added without a contributor belong to everyone's main pot
+        unattributed = self.amount - sum(self.contributions.values())
+        if unattributed or not pots:
+            main_amount, main_level = pots[0] if pots else (0, 0)
+            pots[:1] = [(main_amount + unattributed, main_level)]
+        return pots
+
+    # Showdown: awards every pot to the best hand(s) eligible for it in one pass and
+    # credits the winners.  contenders are the players who have not folded (with
+    # hand_strength already assigned), order is the turn order used for odd chips.
+    # Returns {"pots": [{"amount", "winners"}, ...] main pot first, "payouts": {uuid: chips}}
+    def award(self, contenders, order):
+        seat_order = {uuid: index for index, uuid in enumerate(order)}
+        # biggest contributors first; contribution level decides which pots each one can win
+        by_contribution = sorted(contenders, key=lambda p: self.contributions.get(p.uuid, 0), reverse=True)
+
+        pots = self.side_pots()
+        results = []
+        payouts = {}
+        best_strength = -1
+        winners = []
+        next_contender = 0
+        carried = 0
+        # Walk the pots from the top down: each lower pot's eligible players are the higher
+        # pot's plus whoever put in at least its level, so the best hand is kept incrementally
+        for index in range(len(pots) - 1, -1, -1):
+            amount, level = pots[index]
+            if index == 0:
+                level = 0  # everyone still in plays for the main pot
+            while (next_contender < len(by_contribution)
+                   and self.contributions.get(by_contribution[next_contender].uuid, 0) >= level):
+                player = by_contribution[next_contender]
+                if player.hand_strength > best_strength:
+                    best_strength = player.hand_strength
+                    winners = [player]
+                elif player.hand_strength == best_strength:
+                    winners.append(player)
+                next_contender += 1
+
+            amount += carried
+            if not winners:
+                # only folded players reached this level, their chips play in the pot below
+                carried = amount
+                continue
+            carried = 0
+
+            ordered = sorted(winners, key=lambda p: seat_order.get(p.uuid, len(seat_order)))
+            share, odd_chips = divmod(amount, len(ordered))
+            for place, player in enumerate(ordered):
+                # odd chips go one at a time to the earliest winners in turn order
+                won = share + (1 if place < odd_chips else 0)
+                payouts[player.uuid] = payouts.get(player.uuid, 0) + won
+            results.append({"amount": amount, "winners": [p.uuid for p in ordered]})
+
+        for player in contenders:
+            if player.uuid in payouts:
+                player.receive_money(payouts[player.uuid])
+
+        results.reverse()
+        self.clear_pot()
+        return {"pots": results, "payouts": payouts}
@@ -4,17 +4,35 @@ Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappa's
 """
 
 
-import eventlet
+import hmac
+import json
 import os
-from flask import Flask, request
-from flask_socketio import SocketIO, emit
-
-from game import PokerGame
+from eventlet import tpool
+from flask import Flask, Response, request
+from flask_socketio import SocketIO, emit, join_room
+
+import cluster
+import equity
+import eventlog
+import handhistory
+import matchmaking
+import metrics
+import profiler
+import rankings
+import snapshot
+import wire
+from frames import Frame
+from scheduler import Scheduler
+from timingwheel import TimingWheel
+from tables import TableRegistry
 
 hand_ranking_weight_to_string = {1: "High Card", 2: "One Pair", 3: "Two Pair", 4: "Three of a Kind", 5: "Straight",
                                  6: "Flush", 7: "Full House", 8: "Four of a Kind", 9: "Straight Flush",
                                  10: "Royal Flush"}
 
+# Which worker owns which table when several workers run behind one message queue
+cluster_config = cluster.ClusterConfig()
+
 app = Flask(__name__)
 socketio = SocketIO(
     app,
@@ -22,15 +40,147 @@ socketio = SocketIO(
     async_mode="eventlet",
     ping_interval=10,   # server pings every 10s
     ping_timeout=20,
+    **cluster.socketio_queue_options(),  # cross-worker emits go through SOCKETIO_MESSAGE_QUEUE
 )  # allow external connections
 
-# Single game instance
-game = PokerGame()
-
-player_counter = 0
-
-# Helper function for when it is a player's turn
-def send_turn_prompt(player_or_uuid):
+# Structured JSON-lines log, written off the event loop (see eventlog.py for LOG_LEVEL,
+# LOG_TABLE_LEVELS and LOG_FILE).  It and the writers below run their own threads, so
+# they are opened by init_server()
+events = None
+
+# Every finished hand is appended to HAND_HISTORY_DIR (set it empty to turn logging off)
+hand_history = None
+
+# Every table's PokerGame, keyed by table id; each socket sits at one table and only
+# hears its table's room
+tables = TableRegistry(owns=cluster_config.owns)
+
+# Tables that changed are snapshotted to SNAPSHOT_DIR (set it empty to turn this off) and
+# restored on boot; their players have REJOIN_GRACE seconds to reconnect with their token
+snapshots = None
+REJOIN_GRACE = 60.0
+
+# Delayed table transitions (showdown pause, next hand, runout pacing), keyed by table room
+rounds = Scheduler(socketio.start_background_task, socketio.sleep)
+SHOWDOWN_PAUSE = 2.5  # seconds the revealed hands stay up before the table is cleared
+NEXT_HAND_DELAY = 1.5  # seconds between clearing the table and dealing the next hand
+RUNOUT_STREET_PAUSE = 1.0  # seconds between streets when an all-in board is run out
+
+# Shot clock for whoever is to act: ACTION_SECONDS, then their time bank, then the
+# server checks or folds for them.  One timing wheel holds every table's clock.
+ACTION_SECONDS = 20.0
+action_wheel = TimingWheel()
+action_clocks = {}  # table room -> ActionClock of the player to act
+
+# -------------------- Metrics --------------------
+# Served at /metrics in the Prometheus text format (see metrics.py)
+registry = metrics.Registry()
+handler_seconds = registry.histogram("poker_handler_seconds", "Socket.IO handler run time by event.", ("event",))
+emits_total = registry.counter("poker_emits_total",
+                               "Events sent by event: a room broadcast counts once, an event in a frame once per "
+                               "player it reaches.", ("event",))
+emit_bytes_total = registry.counter("poker_emit_bytes_total", "Encoded size of the events sent, by event.", ("event",))
+packets_total = registry.counter("poker_packets_total", "Socket.IO event packets encoded, frames as frame.",
+                                 ("event",))
+packet_bytes_total = registry.counter("poker_packet_bytes_total", "Size of the encoded Socket.IO event packets.",
+                                      ("event",))
+hands_total = registry.counter("poker_hands_total", "Hands dealt.")
+hands_last_minute = metrics.RateWindow(60)
+registry.gauge("poker_hands_per_minute", "Hands dealt in the last 60 seconds.", hands_last_minute.total)
+registry.gauge("poker_tables", "Tables on this worker.", lambda: len(tables.tables))
+registry.gauge("poker_players", "Players seated on this worker.", lambda: len(tables.table_of))
+registry.gauge("poker_open_tables", "Tables with a free seat, by stake and size.",
+               lambda: {key: open_tables for key, (open_tables, _) in tables.matchmaker.summary().items()},
+               labels=("stake", "size"))
+registry.counter_function("poker_evaluations_total", "Hands scored by the evaluator in the server process.",
+                          lambda: rankings.evaluations)
+equity_evaluations_total = registry.counter("poker_equity_evaluations_total",
+                                            "Hands scored by the equity process pool (samples times hands).")
+registry.counter_function("poker_log_dropped_total", "Log records dropped because the log queue was full.",
+                          lambda: events.dropped)
+
+
+# One event sent, for poker_emits_total; frames report theirs event by event (send_frame)
+def meter_event(event, size):
+    emits_total.inc((event,))
+    emit_bytes_total.inc((event,), size)
+
+
+socketio.server.packet_class = metrics.metered_packet_class(socketio.server.packet_class, packets_total,
+                                                            packet_bytes_total, meter_event)
+
+
+@app.route("/metrics")
+def serve_metrics():
+    return Response(registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# -------------------- Profiling --------------------
+# GET /admin/profile?seconds=10&format=collapsed|speedscope with the X-Admin-Token header
+# samples the server for that long (see profiler.py).  Off unless ADMIN_TOKEN is set.
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+sampler = profiler.Profiler()
+
+
+@app.route("/admin/profile")
+def serve_profile():
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return Response("Forbidden\n", status=403, mimetype="text/plain")
+    try:
+        seconds = float(request.args.get("seconds", 10))
+    except ValueError:
+        return Response("seconds must be a number\n", status=400, mimetype="text/plain")
+    output = request.args.get("format", "collapsed")
+    if output not in ("collapsed", "speedscope"):
+        return Response("format is collapsed or speedscope\n", status=400, mimetype="text/plain")
+
+    try:
+        counts = sampler.profile(max(0.0, seconds), socketio.sleep)
+    except profiler.ProfilerBusy:
+        return Response("A profile is already running\n", status=409, mimetype="text/plain")
+    events.info("profile_taken", seconds=round(sampler.elapsed, 3), samples=sampler.samples)
+    if output == "speedscope":
+        return Response(json.dumps(profiler.speedscope(counts, sampler.sample_seconds())),
+                        mimetype="application/json",
+                        headers={"Content-Disposition": "attachment; filename=profile.speedscope.json"})
+    return Response(profiler.collapsed(counts), mimetype="text/plain")
+
+
+# socketio.on, with the handler's run time recorded under its event (and its samples
+# grouped under it when profiling)
+def on_event(event):
+    def register(handler):
+        sampler.label(handler, event)
+        return socketio.on(event)(metrics.timed(handler_seconds, event)(handler))
+    return register
+
+
+# Wire encoding each socket negotiated in set_name (see wire.py), JSON if missing
+wire_encodings = {}
+
+# Monte Carlo equity runs in a process pool, see publish_equity.  LIVE_EQUITY=0 turns off
+# the equity sent while betting is open; the all-in equity is always shown.
+LIVE_EQUITY = os.environ.get("LIVE_EQUITY", "1") != "0"
+equity_service = equity.EquityService()
+live_equity = equity.LiveEquity(equity_service)
+
+# Table the calling socket is seated at (None before set_name)
+def current_table():
+    return tables.table_for(request.sid)
+
+
+# The table changed; its next snapshot is written on the store's next flush.  The flush
+# loop starts with the first change, so it runs in the process that serves the tables.
+def mark_dirty(table):
+    if snapshots is not None:
+        snapshots.mark(table)
+        snapshots.start(socketio.start_background_task, socketio.sleep)
+
+
+# Helper function for when it is a player's turn, adds the prompt to the transition's frame
+def send_turn_prompt(table, player_or_uuid, frame):
+    game = table.game
     # Accept either a Player object or a UUID string
     if isinstance(player_or_uuid, str):
         player = game.players.get(player_or_uuid)
@@ -38,75 +188,294 @@ def send_turn_prompt(player_or_uuid):
         player = player_or_uuid
 
     if not player:
-        print("[TURN] Tried to prompt non-existent player:", player_or_uuid)
+        events.warning("turn_prompt_missing", table.table_id, uuid=str(player_or_uuid))
         return
 
-    print(f"[TURN] Prompting: {player.name} ({player.uuid})")
+    events.debug("turn_prompt", table.table_id, uuid=player.uuid, name=player.name)
 
-    # Acting player: turn message + allowed actions
-    socketio.emit(
-        'your_turn',
-        {"message": f"It's {player.name}'s turn"},
-        room=None
-    )
+    frame.add('your_turn', {"message": f"It's {player.name}'s turn", "uuid": player.uuid,
+                            "seconds": ACTION_SECONDS, "time_bank": player.time_bank})
+    start_action_clock(table, player)
 
+    # Acting player gets their allowed actions, everyone else explicitly greys out buttons
     actions = game.get_available_actions(player.uuid)
+    for p in game.players.values():
+        frame.add_private(p.uuid, 'available_actions', {"actions": actions if p.uuid == player.uuid else []})
 
-    socketio.emit(
-        'available_actions',
-        {"actions": actions},
-        room=player.uuid
-    )
 
-    # Everyone else: explicitly grey out buttons
-    for p in game.players.values():
-        if p.uuid == player.uuid:
-            continue
-        socketio.emit(
-            'available_actions',
-            {"actions": []},
-            room=p.uuid
-        )
+# -------------------- Action Clock --------------------
+class ActionClock:
+    def __init__(self, uuid, timer):
+        self.uuid = uuid
+        self.timer = timer
+        self.bank_started = None  # clock() when the player started spending their time bank
 
 
-# Broadcast entire game state to all players
-def broadcast_game_state():
-    state = game.serialize_game_state()
-    emit("game_state", state, broadcast=True)
+def start_action_clock(table, player):
+    stop_action_clock(table)
+    timer = action_wheel.schedule(ACTION_SECONDS, on_action_timeout, table, player.uuid)
+    action_clocks[table.room] = ActionClock(player.uuid, timer)
+    action_wheel.start(socketio.start_background_task, socketio.sleep)
 
 
-# Event handlers
+# Cancels the table's clock; time bank seconds the actor spent are taken off their bank
+def stop_action_clock(table):
+    clock = action_clocks.pop(table.room, None)
+    if clock is None:
+        return
+    action_wheel.cancel(clock.timer)
+    player = table.game.players.get(clock.uuid)
+    if player is not None and clock.bank_started is not None:
+        player.time_bank = max(0.0, player.time_bank - (action_wheel.clock() - clock.bank_started))
 
-# When someone connects
-@socketio.on('connect')
-def handle_connect():
-    print(f"Player connected: {request.sid}")
-    emit('connected', 'Connected to server!')
 
+def on_action_timeout(table, uuid):
+    clock = action_clocks.get(table.room)
+    game = table.game
+    player = game.players.get(uuid)
+    if clock is None or clock.uuid != uuid or player is None or not game.round_active:
+        return
 
-# When a player sets their name
-@socketio.on('set_name')
-def handle_set_name(data):
-    global player_counter
-    player_counter += 1  # incrementing the counter each time a player joins
-    name = f"Player {player_counter}"
+    if clock.bank_started is None and player.time_bank > 0:
+        clock.bank_started = action_wheel.clock()
+        clock.timer = action_wheel.schedule(player.time_bank, on_action_timeout, table, uuid)
+        frame = Frame(table)
+        frame.add('time_bank', {"uuid": uuid, "seconds": player.time_bank})
+        frame.add('message', f"{player.name} is using their time bank.")
+        send_frame(frame)
+        return
 
-    # name = data.get('player_name', 'Anonymous')
-    uuid = request.sid
-    emit('seat_position', player_counter)
-    game.add_player(name, uuid, seat_position=data.get('seat_position', player_counter),
-                    seat_position_flag=data.get('seat_position_flag', 0), is_ready=False)
+    # out of time: the same path a click takes, with the mildest legal action
+    actions = game.get_available_actions(uuid)
+    process_action(table, uuid, 'check' if 'check' in actions else 'fold')
+
+
+# Live equity while betting is open, computed in the pool.  Each player only gets their
+# own hand's equity against random hands for the opponents still in: equity between the
+# real hands would tell them who is ahead.  A table's request for a new street replaces
+# the one for the street before (see equity.LiveEquity).
+def publish_equity(table):
+    if not LIVE_EQUITY:
+        return
+    game = table.game
+    snapshot = equity.snapshot_game(game)
+    if len(snapshot["hands"]) < 2:
+        return
+    views = [equity.private_snapshot(snapshot, uuid) for uuid in snapshot["players"]]
+    live_equity.request(table.room, views, (table, game.hand_seed, len(game.community_cards)))
+    live_equity.start(socketio.start_background_task, socketio.sleep, send_private_equity)
+
+
+# An equity result is only sent while the hand and board it was computed for are still
+# up; one that comes back after the next street, the showdown or the next deal is dropped
+def equity_current(game, hand_seed, board_size):
+    return (game.round_active and game.pot.amount > 0 and game.hand_seed == hand_seed
+            and len(game.community_cards) == board_size)
+
+
+def send_private_equity(request, results):
+    table, hand_seed, board_size = request.tag
+    if not equity_current(table.game, hand_seed, board_size):
+        return
+    frame = Frame(table)
+    for view, result in zip(request.views, results):
+        equity_evaluations_total.inc(amount=result["samples"] * (1 + view["opponents"]))
+        result["street"] = table.game.street
+        frame.add_private(view["players"][0], 'equity', result)
+    send_frame(frame)
+
+
+def _exact_equity_task(table, snapshot, hand_seed, board_size):
+    # exact runs score in this process and already count in rankings.evaluations
+    result = tpool.execute(equity.exact_equity, snapshot)
+    if not equity_current(table.game, hand_seed, board_size):
+        return
+    result["street"] = table.game.street
+    socketio.emit('equity', result, to=table.room)
+
+
+# Once everyone left is all-in no more betting can happen, so the whole table sees the
+# exact equity of the real hands.  Small runouts (and anything already cached) are
+# answered right away, a preflop all-in goes to a thread.
+def publish_exact_equity(table, frame):
+    game = table.game
+    snapshot = equity.snapshot_game(game)
+    if equity.runout_count(snapshot) <= equity.EXACT_INLINE_LIMIT:
+        result = equity.exact_equity(snapshot)
+        result["street"] = game.street
+        frame.add('equity', result)
+    else:
+        socketio.start_background_task(_exact_equity_task, table, snapshot, game.hand_seed,
+                                       len(game.community_cards))
 
-    print(f"Added player: {name}, SID={uuid}")
-    print(f"Current players: {[p.name for p in game.players.values()]}")
 
-    # Notify all players of player list
-    emit('player_list', [player.to_dict() for player in game.players.values()], broadcast=True)
+# Sends every player at the frame's table their part of it, in their own encoding
+def send_frame(frame):
+    frame.flush(socketio.emit, wire_encodings, meter_event)
 
 
-@socketio.on('ready')
+# Starts a hand: everyone's hole cards, the state and the first turn prompt in one frame
+def deal_new_hand(table):
+    game = table.game
+    game.start_round()
+    hands_total.inc()
+    hands_last_minute.add()
+    events.info("hand_started", table.table_id, players=len(game.turn_order), seed=game.hand_seed)
+    frame = Frame(table)
+    frame.add('round_started', {})
+
+    # Send each player their hand
+    for player in game.players.values():
+        frame.add_private(player.uuid, 'hand', list(player.hand))
+
+    game.assign_hand_ranking()
+    broadcast_game_state(table, frame)
+    publish_equity(table)
+
+    # Notify current player it's their turn
+    current_player = game.current_player()
+    send_turn_prompt(table, current_player, frame)
+    send_frame(frame)
+
+
+# Broadcast what changed in the game state to everyone at the table, as part of a
+# frame when one is being built
+def broadcast_game_state(table, frame=None, skip_sid=None):
+    mark_dirty(table)
+    delta = table.game.publish_state_delta()
+    if not delta:
+        return
+    if frame is not None:
+        frame.add("game_state_delta", delta)
+    else:
+        # a room broadcast is one payload for everyone, so it goes out as plain JSON
+        socketio.emit("game_state_delta", wire.encode_event("game_state_delta", delta), to=table.room,
+                      skip_sid=skip_sid)
+
+
+# Event handlers
+
+# When someone connects
+@on_event('connect')
+def handle_connect(auth=None):
+    events.debug("connected", sid=request.sid)
+    emit('connected', 'Connected to server!')
+
+
+# When a player sets their name they are seated at a table (the one asked for, or any open one)
+@on_event('set_name')
+def handle_set_name(data):
+    if data is None:
+        data = {}
+    uuid = request.sid
+    table_id = data.get('table_id')
+    if table_id is not None:
+        table_id = str(table_id)
+        # tables live on the worker the hash ring picks, send the client there
+        if not cluster_config.owns(table_id):
+            owner = cluster_config.owner_of(table_id)
+            emit('redirect', {"table_id": table_id, "url": cluster_config.url_of(owner)})
+            return
+    # without a table id the matchmaker seats them by stake (the ante) and table size
+    stake = data.get('stake', matchmaking.DEFAULT_STAKE)
+    size = data.get('table_size', tables.seat_count)
+    if not matchmaking.valid_pool(stake, size):
+        emit('error_message', f"No {size} seat tables at stake {stake}")
+        return
+    # a player whose table was restored from a snapshot takes their old seat back
+    table, seat, old_uuid = tables.rejoin(data.get('rejoin_token'), uuid)
+    if table is None:
+        table, seat = tables.join(uuid, table_id, stake, size)
+    if table is None:
+        emit('error_message', 'That table is full!')
+        return
+    game = table.game
+    join_room(table.room)
+    encoding = wire_encodings[uuid] = wire.negotiate(data.get('encodings'))
+
+    if uuid not in game.players:
+        name = f"Player {seat}"
+        # name = data.get('player_name', 'Anonymous')
+        game.add_player(name, uuid, seat_position=seat,
+                        seat_position_flag=data.get('seat_position_flag', 0), is_ready=False)
+        events.info("player_seated", table.table_id, name=name, sid=uuid, seat=seat, stake=table.stake)
+        if events.enabled(eventlog.DEBUG, table.table_id):
+            events.debug("players", table.table_id, names=[p.name for p in game.players.values()])
+
+    in_hand = game.in_hand(uuid)
+    emit('table_joined', {"table_id": table.table_id, "seat_position": seat, "encoding": encoding,
+                          "rejoin_token": table.token_of(uuid), "in_hand": in_hand})
+    emit('seat_position', seat)
+    # the table gets the new seat as a delta, the newcomer gets the whole state
+    broadcast_game_state(table, skip_sid=uuid)
+    emit('game_state', wire.encode_event('game_state', game.state_snapshot(), encoding))
+
+    # Notify the table of its player list
+    emit('player_list', [player.to_dict() for player in game.players.values()], to=table.room)
+
+    if old_uuid is not None:
+        events.info("player_rejoined", table.table_id, name=game.players[uuid].name, sid=uuid, old_sid=old_uuid)
+        resume_player(table, uuid, old_uuid)
+
+
+# Puts a rejoined player back in the hand: their cards, and the turn prompt if the
+# action is on them (the clock restarts under their new id)
+def resume_player(table, uuid, old_uuid):
+    game = table.game
+    if not game.in_hand(uuid):
+        return
+    frame = Frame(table)
+    frame.add_private(uuid, 'hand', list(game.players[uuid].hand))
+    clock = action_clocks.get(table.room)
+    if clock is not None and clock.uuid == old_uuid and not rounds.has_pending(table.room):
+        send_turn_prompt(table, game.players[uuid], frame)
+    send_frame(frame)
+
+
+# -------------------- Restoring Tables --------------------
+# Rebuilds every table in the snapshot log and picks each one up where it stopped: the
+# player to act gets the clock again, a finished hand is cleared and a runout carries on
+def restore_tables():
+    if snapshots is None:
+        return
+    if snapshots.skipped_version is not None:
+        events.warning("snapshot_version_skipped", path=snapshots.path, version=snapshots.skipped_version,
+                       expected=snapshot.VERSION)
+    for table_id, state in snapshots.load().items():
+        if not cluster_config.owns(table_id):
+            continue
+        table = snapshot.restore_table(table_id, state, hand_history)
+        tables.restore(table)
+        game = table.game
+        if game.round_active:
+            if game.pot.amount == 0:
+                # showdown was already paid out
+                rounds.schedule(table.room, SHOWDOWN_PAUSE, clear_table, table)
+            elif game.is_betting_round_complete() and game.is_all_in() and len(game.community_cards) < 5:
+                rounds.schedule(table.room, RUNOUT_STREET_PAUSE, run_out_street, table)
+            elif game.current_player() is not None:
+                start_action_clock(table, game.current_player())
+        elif game.hand_seed is not None:
+            # between two hands
+            rounds.schedule(table.room, NEXT_HAND_DELAY, start_next_hand, table)
+        rounds.schedule(f"{table.room}:rejoin", REJOIN_GRACE, drop_away_players, table)
+    events.info("tables_restored", tables=len(tables.tables), path=snapshots.path)
+
+
+# Players that never came back to a restored table leave it as if they disconnected
+def drop_away_players(table):
+    for uuid in list(table.away):
+        drop_player(uuid)
+
+
+@on_event('ready')
 def handle_ready(data):
     uuid = request.sid
+    table = current_table()
+    if table is None:
+        emit('error_message', 'Join a table first.')
+        return
+    game = table.game
     if data is None:
         data = {}
 
@@ -117,7 +486,8 @@ def handle_ready(data):
     else:
         new_val = game.set_ready(uuid, bool(data.get('ready', True)))
 
-    print(f"Player {uuid} ready set to {new_val}")
+    events.debug("ready", table.table_id, sid=uuid, ready=new_val)
+    mark_dirty(table)
     # Broadcast updated player list AND ready state
     lobby_state = [{
         "uuid": p.uuid,
@@ -125,34 +495,17 @@ def handle_ready(data):
         "ready": getattr(p, "ready", False)
     } for p in game.players.values()]
 
-    emit("lobby_state", lobby_state, broadcast=True)
-
-
-@socketio.on("ready_for_next_round")
-def handle_ready_for_next_round(_):
-    # Reset round state
-    game.reset_round()
-
-    # Start round
-    game.start_round()
-    print("New round started")
-    emit('round_started', {}, broadcast=True)
-
-    # Send each player their hand
-    for player in game.players.values():
-        socketio.emit('hand', [str(card) for card in player.hand], room=player.uuid)
-
-    game.assign_hand_ranking()
-    emit('game_state', game.serialize_game_state(), broadcast=True)
-
-    # Notify current player it's their turn
-    current_player = game.current_player()
-    send_turn_prompt(current_player)
+    emit("lobby_state", lobby_state, to=table.room)
 
 
 # Start a new round
-@socketio.on('start_game')
+@on_event('start_game')
 def handle_start_game(_):
+    table = current_table()
+    if table is None:
+        emit('error_message', 'Join a table first.')
+        return
+    game = table.game
     if game.round_active:
         emit('error_message', 'A round is already in progress!')
         return
@@ -165,31 +518,31 @@ def handle_start_game(_):
         emit('error_message', 'Everyone must be ready!')
         return
 
-    game.start_round()
-    print("New round started")
+    # a manual start replaces whatever the scheduler had queued for this table
+    rounds.cancel(table.room)
+    deal_new_hand(table)
 
-    emit('round_started', {}, broadcast=True)
 
-    # Send each player their hand
-    for player in game.players.values():
-        socketio.emit('hand', [str(card) for card in player.hand], room=player.uuid)
-
-    game.assign_hand_ranking()
-    emit('game_state', game.serialize_game_state(), broadcast=True)
-
-    # Notify current player it's their turn
-    current_player = game.current_player()
-    send_turn_prompt(current_player)
+@on_event('disconnect')
+def handle_disconnect(_):
+    drop_player(request.sid)
 
 
-@socketio.on('disconnect')
-def handle_disconnect(_):
-    sid = request.sid
-    print(f"Player disconnected: {sid}")
+# Takes a player out of their table and moves the hand along without them
+def drop_player(sid):
+    # client_exit already did this for a clean exit
+    wire_encodings.pop(sid, None)
+    table = tables.leave(sid)
+    if table is None:
+        events.debug("disconnected", sid=sid)
+        return
+    events.info("disconnected", table.table_id, sid=sid)
+    game = table.game
 
     result = game.on_disconnect(sid)
 
-    emit('message', "A player has disconnected.", broadcast=True)
+    frame = Frame(table)
+    frame.add('message', "A player has disconnected.")
 
     player_list_payload = [
         {
@@ -201,134 +554,207 @@ def handle_disconnect(_):
         }
         for p in game.players.values()
     ]
-    emit('player_list', player_list_payload, broadcast=True)
+    frame.add('player_list', player_list_payload)
+
+    if result.get("ended_round") or table.is_empty():
+        # nothing left to pace at this table
+        rounds.cancel(table.room)
+        stop_action_clock(table)
 
     if result.get("ended_round"):
-        emit('message', "Round ended due to disconnect (not enough players).", broadcast=True)
-        for player in game.players.values():
-            emit('hand', [], to=player.uuid)
-        emit('community_cards', [], broadcast=True)
-        emit('game_state', game.serialize_game_state(), broadcast=True)
+        frame.add('message', "Round ended due to disconnect (not enough players).")
+        frame.add('hand', [])
+        frame.add('community_cards', [])
+        broadcast_game_state(table, frame)
+        send_frame(frame)
         return
 
-    if result.get("ended_round") is False:
+    if result.get("ended_round") is False and game.round_active:
         actor = game.current_player()
         if not actor or actor.folded or actor.chips == 0:
             actor = game.advance_turn()
 
-        print(f"[DISCONNECT] Next actor after disconnect: {actor.uuid if actor else None}")
-        if actor:
-            send_turn_prompt(actor)
+        events.debug("next_actor", table.table_id, uuid=actor.uuid if actor else None)
+        # the clock only starts over when the action moved on to someone else
+        clock = action_clocks.get(table.room)
+        if actor and (clock is None or clock.uuid != actor.uuid) and not rounds.has_pending(table.room):
+            send_turn_prompt(table, actor, frame)
 
-    emit('game_state', game.serialize_game_state(), broadcast=True)
+    broadcast_game_state(table, frame)
+    send_frame(frame)
 
-@socketio.on('client_exit')
+@on_event('client_exit')
 def handle_client_exit(_=None):
-    handle_disconnect(_)
+    drop_player(request.sid)
+
 
+# A client that sees a version gap in game_state_delta asks for the whole state again
+@on_event('request_state')
+def handle_request_state(_=None):
+    table = current_table()
+    if table is None:
+        return
+    snapshot = table.game.state_snapshot()
+    emit('game_state', wire.encode_event('game_state', snapshot, wire_encodings.get(request.sid, wire.JSON)))
 
-@socketio.on('player_action')
+
+@on_event('player_action')
 def handle_action(data):
     uuid = request.sid
     action = data.get('action')
     amount = int(data.get('amount', 0))
 
+    table = current_table()
+    if table is None:
+        emit('error_message', "No active round.", to=uuid)
+        return
+    game = table.game
     if not game.round_active:
         emit('error_message', "No active round.", to=uuid)
         return
+    if rounds.has_pending(table.room):
+        emit('error_message', "Wait for the next hand.", to=uuid)
+        return
+    process_action(table, uuid, action, amount)
+
+
+# Applies one action (a click or a timeout) and moves the hand along
+def process_action(table, uuid, action, amount=0):
+    game = table.game
+    stop_action_clock(table)
 
+    # everything this action causes reaches each player as one frame
+    frame = Frame(table)
     ok, msg = game.apply_action(uuid, action, amount)
-    emit('bet_message', msg, broadcast=True)
+    frame.add('bet_message', msg)
+    mark_dirty(table)
 
     if game.is_betting_round_complete():
-        progress_betting_round()
+        progress_betting_round(table, frame)
     else:
         nxt = game.advance_turn()
         if nxt:
-            send_turn_prompt(nxt)
+            send_turn_prompt(table, nxt, frame)
         # Send game state on every action instead of after each deal
-        broadcast_game_state()
+        broadcast_game_state(table, frame)
+        send_frame(frame)
 
-def progress_betting_round():
+def progress_betting_round(table, frame):
+    game = table.game
     # Automatically move to next street or showdown
     if game.street != "river":
         game.move_to_next_street()
         # Send newly dealt community cards only (keeps same behavior as before)
-        emit('community_cards', [str(c) for c in game.community_cards], broadcast=True)
+        frame.add('community_cards', list(game.community_cards))
         game.assign_hand_ranking()
         # Broadcast updated game state
-        emit('game_state', game.serialize_game_state(), broadcast=True)
+        broadcast_game_state(table, frame)
+        publish_equity(table)
 
         # Notify first active player in new street
         current_player = game.current_player()
-        send_turn_prompt(current_player)
+        send_turn_prompt(table, current_player, frame)
+        send_frame(frame)
 
     else:
-        # Showdown logic (placeholder)
-        game.assign_hand_ranking()
-        best_rank, winning_players = game.rank_all_player_hands()
-        print(f'BEST HAND IS {hand_ranking_weight_to_string[best_rank]} -- {[player.name for player in winning_players]}')
-        if len(winning_players) < 1:
-            emit('error_message', "Less than 1 winning player... A curious bug indeed.")
-        if len(winning_players) == 1:
-            game.pot.payout_single(winning_players[0])
-        else:
-            game.pot.payout_split_pot(winning_players)
-
-        # flip over all cards visually
-        all_hands = {}
-        for player in game.players.values():
-            if not player.folded and len(player.hand) > 0:
-                all_hands[player.seat_position] = [str(card) for card in player.hand]
-        emit('reveal_hands', {"hands":all_hands}, broadcast=True)
-
-
-        message = f'BEST HAND IS {hand_ranking_weight_to_string[best_rank]} -- {[player.name for player in winning_players]}'
-        emit('bet_message', message, broadcast=True)
-        emit('message', "Round over! Showdown now.", broadcast=True)
-        emit('game_state', game.serialize_game_state(), broadcast=True)
-
-        eventlet.sleep(2.5)
-        emit('round_reset', {}, broadcast=True)
-
-
-@socketio.on('request_flop')
-def handle_flop_request(_):
-    if not game.round_active:
-        emit('error_message', 'No active round.')
-        return
+        # Everyone left is all-in: show exact equity, then run out the rest of the board
+        # one street at a time
+        if game.is_all_in() and len(game.community_cards) < 5:
+            publish_exact_equity(table, frame)
+            send_frame(frame)
+            rounds.schedule(table.room, RUNOUT_STREET_PAUSE, run_out_street, table)
+            return
+        finish_hand(table, frame)
+
+
+# Deals the next street of an all-in runout; the showdown follows the river
+def run_out_street(table):
+    game = table.game
+    {0: game.deal_flop, 3: game.deal_turn, 4: game.deal_river}[len(game.community_cards)]()
+    game.assign_hand_ranking()
+    frame = Frame(table)
+    frame.add('community_cards', list(game.community_cards))
+    broadcast_game_state(table, frame)
+    send_frame(frame)
+    if len(game.community_cards) < 5:
+        rounds.schedule(table.room, RUNOUT_STREET_PAUSE, run_out_street, table)
+    else:
+        rounds.schedule(table.room, RUNOUT_STREET_PAUSE, finish_hand, table)
+
+
+def finish_hand(table, frame=None):
+    game = table.game
+    frame = frame or Frame(table)
+    # Showdown: main and side pots are all awarded in one pass
+    result = game.showdown()
+    best_rank, winning_players = game.rank_all_player_hands()
+    message = f'BEST HAND IS {hand_ranking_weight_to_string[best_rank]} -- {[player.name for player in winning_players]}'
+    events.info("showdown", table.table_id, rank=hand_ranking_weight_to_string[best_rank],
+                winners=[player.name for player in winning_players], payouts=result["payouts"])
+    result["message"] = message
+    frame.add('showdown', result)
+
+    # flip over all cards visually
+    all_hands = {}
+    for player in game.players.values():
+        if not player.folded and len(player.hand) > 0:
+            all_hands[player.seat_position] = list(player.hand)
+    frame.add('reveal_hands', {"hands":all_hands})
+
+    frame.add('message', "Round over! Showdown now.")
+    broadcast_game_state(table, frame)
+    send_frame(frame)
 
-    if len(game.community_cards) > 0:
-        return  # Flop already dealt
+    rounds.schedule(table.room, SHOWDOWN_PAUSE, clear_table, table)
 
-    game.deal_flop()
-    print("Flop dealt:", [str(c) for c in game.community_cards])
-    print(f'BEST HAND {game.rank_all_player_hands()}')
-    emit("community_cards", [str(card) for card in game.community_cards], broadcast=True)
 
+def clear_table(table):
+    socketio.emit('round_reset', {}, to=table.room)
+    rounds.schedule(table.room, NEXT_HAND_DELAY, start_next_hand, table)
 
-@socketio.on('request_turn')
-def handle_turn_request(_):
-    if len(game.community_cards) != 3:
-        emit('error_message', 'Flop must be dealt first.')
+
+# The server deals the next hand itself once the table has been cleared
+def start_next_hand(table):
+    game = table.game
+    game.reset_round()
+    if len(game.players) < 2:
+        broadcast_game_state(table)
         return
-    game.deal_turn()
-    emit("community_cards", [str(card) for card in game.community_cards], broadcast=True)
+    deal_new_hand(table)
 
 
-@socketio.on('request_river')
-def handle_river_request(_):
-    if len(game.community_cards) != 4:
-        emit('error_message', 'Turn must be dealt first.')
+# -------------------- Startup --------------------
+# Opens the log, hand history and snapshot writers and restores the tables, once per
+# process.  It runs when this file is imported as well as run, so an import based runner
+# (gunicorn app:app) serves with everything set up.  The equity pool's spawned workers
+# import this file again as __mp_main__ and must not start a second set of writers.
+def init_server():
+    global events, hand_history, snapshots
+    if events is not None:
         return
-    game.deal_river()
-    emit("community_cards", [str(card) for card in game.community_cards], broadcast=True)
+    events = eventlog.EventLog.from_environment({"worker": cluster_config.worker_id})
+
+    history_dir = os.environ.get("HAND_HISTORY_DIR", "hand_history")
+    hand_history = (handhistory.HandHistoryWriter(history_dir, worker_id=cluster_config.worker_id)
+                    if history_dir else None)
+    tables.history = hand_history
+
+    snapshot_dir = os.environ.get("SNAPSHOT_DIR", "snapshots")
+    snapshots = (snapshot.SnapshotStore(os.path.join(snapshot_dir, f"tables-{cluster_config.worker_id}.snap"))
+                 if snapshot_dir else None)
+    restore_tables()
+
 
+if __name__ != "__mp_main__":
+    init_server()
 
 if __name__ == "__main__":
-    print("Starting poker server...")
+    events.info("server_starting", port=int(os.environ.get("PORT", 5000)))
+    # no reloader: it would serve from a second process (and thread) while this one, which
+    # restored the tables and owns the writers, only watches the files
     socketio.run(app, 
                  host="0.0.0.0", 
                  port=int(os.environ.get("PORT", 5000)), 
                  debug=True, 
+                 use_reloader=False,
                  allow_unsafe_werkzeug=True)
@@ -0,0 +1,199 @@
+"""
+CS 3050 Poker Game - bench.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Microbenchmarks for the engine's hot paths on 2, 6 and 10 player tables, with fixed
+seeds so every run times the same work.
+
+  python bench.py --save              # record bench_baseline.json on this machine
+  python bench.py --threshold 10      # fail if any case got more than 10% slower
+  python bench.py --filter rank_hand
+
+Times are the best of --repeat runs, in seconds per operation.
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import rankings
+from game import PokerGame
+
+TABLE_SIZES = (2, 6, 10)
+SEED = 3050
+CALLS = 200  # read-only cases are called this many times per timed run
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+# -------------------- Fixtures --------------------
+def new_game(players, seed=SEED):
+    game = PokerGame(seed=seed)
+    for seat in range(1, players + 1):
+        game.add_player(f"Player {seat}", f"bench-{seat}", seat_position=seat, seat_position_flag=0, is_ready=True)
+    return game
+
+
+# The preflop orbit as (uuid, action): everyone checks if they can and calls otherwise
+def preflop_script(players):
+    game = new_game(players)
+    game.start_round()
+    script = []
+    while not game.is_betting_round_complete():
+        player = game.current_player()
+        action = "check" if "check" in game.get_available_actions(player.uuid) else "call"
+        game.apply_action(player.uuid, action)
+        script.append((player.uuid, action))
+        game.advance_turn()
+    return script
+
+
+def random_hands(count, seed=SEED):
+    rng = random.Random(seed)
+    return [rng.sample(range(52), 7) for _ in range(count)]
+
+
+def repeated(call, calls=CALLS):
+    def run(game):
+        for _ in range(calls):
+            call(game)
+    return run
+
+
+# -------------------- Cases --------------------
+# Every case is (setup, run, operations per run): setup builds fresh state outside the
+# timer, run(state) is what gets timed
+def build_cases():
+    cases = {}
+
+    hands = random_hands(1000)
+
+    def rank_hands(_):
+        for hand in hands:
+            rankings.rank_hand(hand)
+    cases["rank_hand"] = (None, rank_hands, len(hands))
+
+    for players in TABLE_SIZES:
+        script = preflop_script(players)
+
+        def fresh_game(players=players):
+            return new_game(players)
+        # start_round resets the whole table, so it can be dealt again and again
+        cases[f"start_round/{players}p"] = (fresh_game, repeated(PokerGame.start_round, 20), 20)
+
+        def started(players=players):
+            game = new_game(players)
+            game.start_round()
+            return game
+
+        def apply_script(game, script=script):
+            for uuid, action in script:
+                game.apply_action(uuid, action)
+                game.advance_turn()
+        cases[f"apply_action/{players}p"] = (started, apply_script, len(script))
+
+        # halfway through the orbit, when every call has to look at the whole table
+        def mid_orbit(players=players, script=script):
+            game = started(players)
+            apply_script(game, script[:len(script) // 2])
+            return game
+        cases[f"is_betting_round_complete/{players}p"] = (
+            mid_orbit, repeated(PokerGame.is_betting_round_complete), CALLS)
+
+        def at_river(players=players):
+            game = started(players)
+            game.deal_runout()
+            game.assign_hand_ranking()
+            return game
+        cases[f"rank_all_player_hands/{players}p"] = (at_river, repeated(PokerGame.rank_all_player_hands), CALLS)
+
+        def on_flop(players=players):
+            game = started(players)
+            game.deal_flop()
+            return game
+        cases[f"serialize_game_state/{players}p"] = (on_flop, repeated(PokerGame.serialize_game_state), CALLS)
+
+    return cases
+
+
+# -------------------- Runner --------------------
+def measure(setup, run, operations, repeat, min_time):
+    best = float("inf")
+    # like timeit, keep the collector from landing in random samples
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            total = 0.0
+            runs = 0
+            # keep calling until the sample is long enough to trust the clock
+            while total < min_time:
+                state = setup() if setup else None
+                start = time.perf_counter()
+                run(state)
+                total += time.perf_counter() - start
+                runs += 1
+            best = min(best, total / (runs * operations))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the poker engine hot paths")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per sample")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("cases", {})
+
+    results = {}
+    regressions = []
+    for name, (setup, run, operations) in build_cases().items():
+        if args.filter not in name:
+            continue
+        seconds = measure(setup, run, operations, args.repeat, args.min_time)
+        results[name] = seconds
+        line = f"{name:40} {format_time(seconds):>10}/op"
+        if name in baseline:
+            change = (seconds / baseline[name] - 1) * 100
+            line += f"  {change:+6.1f}%"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        saved = dict(baseline, **results)
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "cases": saved},
+                      f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions and not args.save:
+        print(f"{len(regressions)} case(s) slower than baseline by more than {args.threshold}%: "
+              f"{', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
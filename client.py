@@ -12,6 +12,7 @@ import arcade
 import socketio
 import arcade.gui as gui
 
+import wire
 from Card import Card
 from game import PokerGame
 import tkinter as tk
@@ -129,6 +130,8 @@ class PokerGameClient(arcade.Window):
         self.betting_text = "No Current Bet"
         self.player_name = "Player"
         self.seat_position = 0
+        self.table_id = None  # assigned by the server on join
+        self.rejoin_token = None  # sent back on reconnect to get the same seat after a server restart
         self.player_list = []
         self.lobby = []
         self.all_ready = False
@@ -166,8 +169,12 @@ class PokerGameClient(arcade.Window):
         self.phase = Phase.LOBBY
 
         self.current_game_state = None
+        # Live equity per player uuid, sent by the server each street
+        self.equity = {}
         # Used for greying buttons
         self.is_my_turn = False
+        # time.monotonic() when the server will act for us, while it is our turn
+        self.turn_deadline = None
         # Used for custom betting
         self.bet_amount_input = None
 
@@ -414,7 +421,8 @@ class PokerGameClient(arcade.Window):
         def connect():
             print("Connected to server.")
             self.status_text = "Connected!"
-            self.sio.emit("set_name", {"player_name": self.player_name})
+            self.sio.emit("set_name", {"player_name": self.player_name, "table_id": self.table_id,
+                                      "encodings": wire.supported(), "rejoin_token": self.rejoin_token})
 
         @self.sio.on("lobby_state")
         def on_lobby_state(data):
@@ -430,6 +438,25 @@ class PokerGameClient(arcade.Window):
             self.status_text = f"Players: {', '.join([player['name'] for player in player_dictionaries])}"
             self.player_list = player_dictionaries
 
+        @self.sio.on("redirect")
+        def on_redirect(data):
+            # the table is hosted by another worker: reconnect there and ask for it again
+            self.table_id = data.get("table_id")
+            if data.get("url"):
+                self.server_url = data["url"]
+            threading.Thread(target=self.reconnect_to_server, daemon=True).start()
+
+        @self.sio.on("table_joined")
+        def on_table_joined(data):
+            self.table_id = data.get("table_id")
+            self.seat_position = data.get("seat_position", self.seat_position)
+            self.rejoin_token = data.get("rejoin_token")
+            if data.get("in_hand"):
+                # back in a hand that was going on before the server restarted
+                self.apply_phase(Phase.IN_HAND)
+                self.game_started = True
+                self.show_title_screen = False
+
         @self.sio.on("seat_position")
         def set_seat_position(seat_position: int):
             self.seat_position = seat_position
@@ -461,6 +488,15 @@ class PokerGameClient(arcade.Window):
         def your_turn(data):
             self.status_text = data["message"]
             self.is_my_turn = True
+            if data.get("uuid") == self.sio.get_sid():
+                self.turn_deadline = time.monotonic() + data.get("seconds", 0)
+            else:
+                self.turn_deadline = None
+
+        @self.sio.on("time_bank")
+        def on_time_bank(data):
+            if data.get("uuid") == self.sio.get_sid():
+                self.turn_deadline = time.monotonic() + data.get("seconds", 0)
 
         @self.sio.on("available_actions")
         def available_actions(_):
@@ -488,17 +524,53 @@ class PokerGameClient(arcade.Window):
             print(message)
             self.betting_text = message
 
+        @self.sio.on("showdown")
+        def on_showdown(result):
+            print("Showdown", result)
+            self.betting_text = result.get("message", "")
+
         @self.sio.on("error_message")
         def post_error(data):
             self.status_text = f"Error: {data}"
 
+        @self.sio.on("equity")
+        def on_equity(data):
+            self.equity = data.get("equity", {})
+
         @self.sio.on("game_state")
         def on_game_state(state):
-            self.current_game_state = state
-
-            my_uuid = self.sio.get_sid()
-            current_turn = state.get("current_turn")
-            self.is_my_turn = (current_turn == my_uuid)
+            self.current_game_state = wire.decode_event(state)
+            self.update_turn_from_state()
+
+        @self.sio.on("game_state_delta")
+        def on_game_state_delta(delta):
+            delta = wire.decode_event(delta)
+            state = self.current_game_state
+            # missed a version (or never had one): ask for the full snapshot instead
+            if state is None or state.get("version") != delta.get("base"):
+                self.sio.emit("request_state", {})
+                return
+            self.current_game_state = apply_state_delta(state, delta)
+            self.update_turn_from_state()
+
+        @self.sio.on("frame")
+        def on_frame(frame):
+            # one message per transition: replay its events through the handlers above, in order
+            handlers = self.sio.handlers.get("/", {})
+            for event, data in wire.decode_frame(frame):
+                handler = handlers.get(event)
+                if handler:
+                    handler(data)
+
+    def update_turn_from_state(self):
+        state = self.current_game_state
+        my_uuid = self.sio.get_sid()
+        current_turn = state.get("current_turn")
+        self.is_my_turn = (current_turn == my_uuid)
+
+    def reconnect_to_server(self):
+        self.sio.disconnect()
+        self.connect_to_server()
 
     def connect_to_server(self):
         try:
@@ -589,6 +661,15 @@ class PokerGameClient(arcade.Window):
             arcade.draw_text(f"Hand rank: {HAND_RANKING_NUM_TO_STRING[my_player['hand_rank']]}",
                              10, SCREEN_HEIGHT - 90, arcade.color.BLUE_GREEN, 18)
 
+            my_equity = self.equity.get(my_uuid)
+            if my_equity:
+                arcade.draw_text(f"Equity: {my_equity['equity'] * 100:.1f}%",
+                                 10, SCREEN_HEIGHT - 120, arcade.color.LIGHT_GRAY, 18)
+
+            if self.is_my_turn and self.turn_deadline is not None:
+                seconds_left = max(0, math.ceil(self.turn_deadline - time.monotonic()))
+                arcade.draw_text(f"Time: {seconds_left}s", 10, SCREEN_HEIGHT - 150, arcade.color.WHITE, 18)
+
     # render the player name at each stool with the client player localized to the bottom.
     def draw_players_around_table(self):
         cx, cy = self.table_center_x, self.table_center_y
@@ -819,8 +900,7 @@ class PokerGameClient(arcade.Window):
         deck_x, deck_y = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2  # deck position (adjust as needed)
 
         for i, card_str in enumerate(cards):
-            value, _, suit = card_str.partition(" of ")
-            card = Card(suit, value, CARD_SCALE)
+            card = Card.from_wire(card_str, CARD_SCALE)
             card.center_x = deck_x
             card.center_y = deck_y
 
@@ -860,8 +940,7 @@ class PokerGameClient(arcade.Window):
                 arcade.play_sound(self.card_flip_sound, volume=1.0)
 
             for i, card_str in enumerate(cards):
-                value, _, suit = card_str.partition(" of ")
-                card = Card(suit, value, CARD_SCALE)
+                card = Card.from_wire(card_str, CARD_SCALE)
 
                 # Position the card
                 card.center_x = base_x + i * space_offset
@@ -883,12 +962,11 @@ class PokerGameClient(arcade.Window):
         deck_x, deck_y = SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2  # SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 + 120 #deck origin point
 
         for i, card_str in enumerate(cards):
-            value, _, suit = card_str.partition(" of ")
-            card = Card(suit, value, CARD_SCALE)
+            card = Card.from_wire(card_str, CARD_SCALE)
             card.center_x = deck_x
             card.center_y = deck_y
 
-            already_dealt = any(c.value + " of " + c.suit == card_str for c in self.community_cards)
+            already_dealt = any(str(c) == str(card) for c in self.community_cards)
             if already_dealt:
                 continue
             self.community_cards.append(card)
@@ -944,6 +1022,7 @@ class PokerGameClient(arcade.Window):
 
         # Clear logical data
         self.cards_dealt = False
+        self.equity = {}
         self.pending_hand = None
         self.pending_community_cards = None
 
@@ -954,12 +1033,28 @@ class PokerGameClient(arcade.Window):
 
         # Clear other players hands
         self.other_hands.clear()
-
-        # Tell the server to start a new round after a few seconds
-        if self.game_started:
-            my_uuid = self.sio.get_sid()
-            if my_uuid == self.player_list[0]['uuid']:
-                arcade.schedule_once(lambda dt: self.sio.emit("ready_for_next_round", {}), 1.5)
+        # the server deals the next hand on its own schedule
+
+
+# Applies a versioned game_state_delta on top of the state it was built from
+def apply_state_delta(state, delta):
+    changes = delta["changes"]
+    new_state = {key: value for key, value in state.items() if key != "players"}
+    new_state.update((key, value) for key, value in changes.items()
+                     if key not in ("players", "removed_players"))
+
+    removed = set(changes.get("removed_players", []))
+    changed_players = dict(changes.get("players", {}))
+    players = []
+    for player in state.get("players", []):
+        if player["uuid"] in removed:
+            continue
+        fields = changed_players.pop(player["uuid"], None)
+        players.append(dict(player, **fields) if fields else player)
+    players.extend(changed_players.values())  # players who just sat down
+    new_state["players"] = players
+    new_state["version"] = delta["version"]
+    return new_state
 
 
 def main():
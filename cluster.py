@@ -0,0 +1,210 @@
+"""
+CS 3050 Poker Game - cluster.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Running several app.py workers side by side:
+  * every table is owned by one worker, picked by consistent hashing of its table id
+  * emits from any worker reach clients on every worker through a Socket.IO message queue
+  * `python cluster.py --workers 4` starts a local broker plus four workers on one machine
+"""
+
+import argparse
+import bisect
+import hashlib
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+
+from socketio import PubSubManager
+
+VIRTUAL_NODES = 64
+LENGTH = struct.Struct("!I")
+
+
+# -------------------- Consistent Hashing --------------------
+def _hash(key):
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, workers, virtual_nodes=VIRTUAL_NODES):
+        self.workers = list(workers)
+        points = sorted((_hash(f"{worker}#{i}"), worker) for worker in self.workers for i in range(virtual_nodes))
+        self.keys = [point for point, _ in points]
+        self.owners = [worker for _, worker in points]
+
+    def owner(self, key):
+        if not self.keys:
+            return None
+        index = bisect.bisect(self.keys, _hash(str(key))) % len(self.keys)
+        return self.owners[index]
+
+
+# CLUSTER_WORKERS="w1=http://10.0.0.1:5001,w2=http://10.0.0.2:5001" and WORKER_ID="w1".
+# Without them the process is a cluster of one that owns every table.
+class ClusterConfig:
+    def __init__(self, worker_id=None, workers=None):
+        self.worker_id = worker_id or os.environ.get("WORKER_ID", "local")
+        if workers is None:
+            workers = {}
+            for entry in filter(None, os.environ.get("CLUSTER_WORKERS", "").split(",")):
+                name, _, url = entry.partition("=")
+                workers[name.strip()] = url.strip()
+        self.workers = workers or {self.worker_id: None}
+        self.ring = HashRing(sorted(self.workers))
+
+    def owner_of(self, table_id):
+        return self.ring.owner(table_id)
+
+    def owns(self, table_id):
+        return self.owner_of(table_id) == self.worker_id
+
+    def url_of(self, worker_id):
+        return self.workers.get(worker_id)
+
+
+# -------------------- Local Message Queue --------------------
+# A stand-in for Redis when every worker runs on one machine: the broker relays each
+# length-prefixed frame it receives to every other connected worker.
+def _send_frame(sock, payload):
+    sock.sendall(LENGTH.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("broker connection closed")
+        data += chunk
+    return data
+
+
+def _recv_frame(sock):
+    (size,) = LENGTH.unpack(_recv_exact(sock, LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+def run_broker(host="127.0.0.1", port=5999, ready=None):
+    server = socket.create_server((host, port))
+    peers = set()
+    lock = threading.Lock()
+
+    def relay(peer):
+        try:
+            while True:
+                frame = _recv_frame(peer)
+                with lock:
+                    targets = [p for p in peers if p is not peer]
+                for target in targets:
+                    try:
+                        _send_frame(target, frame)
+                    except OSError:
+                        pass
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            with lock:
+                peers.discard(peer)
+            peer.close()
+
+    if ready is not None:
+        ready.set()
+    while True:
+        peer, _ = server.accept()
+        with lock:
+            peers.add(peer)
+        threading.Thread(target=relay, args=(peer,), daemon=True).start()
+
+
+def _parse_local_url(url):
+    host, _, port = url[len("local://"):].partition(":")
+    return host or "127.0.0.1", int(port or 5999)
+
+
+# Socket.IO client manager that publishes through the local broker (url "local://host:port")
+class LocalQueueManager(PubSubManager):
+    name = "local"
+
+    def __init__(self, url="local://127.0.0.1:5999", channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = _parse_local_url(url)
+        self.sock = None
+        # green sockets (and a green lock so concurrent publishes don't interleave frames)
+        # when running inside the eventlet server, so the listener never blocks the loop
+        try:
+            from eventlet.green import socket as socket_module
+            from eventlet.semaphore import Semaphore as Lock
+        except ImportError:
+            socket_module = socket
+            Lock = threading.Lock
+        self.socket_module = socket_module
+        self.publish_lock = Lock()
+
+    def _connect(self):
+        if self.sock is None:
+            self.sock = self.socket_module.create_connection(self.address)
+
+    def _publish(self, data):
+        payload = self.json.dumps(data).encode()
+        with self.publish_lock:
+            self._connect()
+            _send_frame(self.sock, payload)
+
+    def _listen(self):
+        self._connect()
+        while True:
+            yield _recv_frame(self.sock).decode()
+
+
+# Picks the Socket.IO client manager for SOCKETIO_MESSAGE_QUEUE: local:// uses the bundled
+# broker, anything else (redis://, amqp://, ...) is handed to Flask-SocketIO as message_queue
+def socketio_queue_options(url=None):
+    url = url if url is not None else os.environ.get("SOCKETIO_MESSAGE_QUEUE")
+    if not url:
+        return {}
+    if url.startswith("local://"):
+        return {"client_manager": LocalQueueManager(url)}
+    return {"message_queue": url}
+
+
+# -------------------- Local Cluster Launcher --------------------
+def main():
+    parser = argparse.ArgumentParser(description="Run a broker and several poker workers on this machine")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=5001)
+    parser.add_argument("--broker-port", type=int, default=5999)
+    parser.add_argument("--host", default="127.0.0.1")
+    args = parser.parse_args()
+
+    ready = threading.Event()
+    threading.Thread(target=run_broker, args=(args.host, args.broker_port, ready), daemon=True).start()
+    ready.wait()
+
+    workers = {f"w{i}": f"http://{args.host}:{args.base_port + i}" for i in range(args.workers)}
+    cluster_workers = ",".join(f"{name}={url}" for name, url in workers.items())
+    processes = []
+    for i, name in enumerate(workers):
+        env = dict(os.environ,
+                   PORT=str(args.base_port + i),
+                   WORKER_ID=name,
+                   CLUSTER_WORKERS=cluster_workers,
+                   SOCKETIO_MESSAGE_QUEUE=f"local://{args.host}:{args.broker_port}")
+        processes.append(subprocess.Popen([sys.executable, "app.py"], env=env,
+                                          cwd=os.path.dirname(os.path.abspath(__file__))))
+        print(f"Started {name} on {workers[name]}")
+
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    main()
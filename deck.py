@@ -5,20 +5,48 @@ Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
 
 
 import random
-import Card
+import rankings
+
+SUITS = rankings.SUITS
+RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+
+# The server deals plain integer cards (see rankings.encode_card), sprites only exist on the client.
+# Every card's display string ("10 of Hearts") is looked up by its code.
+CARD_NAMES = [""] * 52
+for _suit in SUITS:
+    for _number, _rank in enumerate(RANKS, start=1):
+        CARD_NAMES[rankings.encode_card(_suit, _number)] = f"{_rank} of {_suit}"
+CARD_NAMES = tuple(CARD_NAMES)
+CARD_CODES = {name: code for code, name in enumerate(CARD_NAMES)}
+
+# The one 52 card table every deck is refilled from, in the same order the old sprite deck was built
+FULL_DECK = tuple(rankings.encode_card(suit, number) for suit in SUITS for number in range(1, 14))
+
+
+def card_names(cards):
+    return [CARD_NAMES[card] for card in cards]
 
 
 class Deck:
     def __init__(self):
-        suits = ["Hearts", "Diamonds", "Clubs", "Spades"]
-        ranks = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-        self.cards = [Card.Card(suit, rank) for suit in suits for rank in ranks]
+        self.cards = list(FULL_DECK)
+
+    # put every card back without allocating a new deck
+    def reset(self):
+        self.cards[:] = FULL_DECK
 
-    def shuffle(self):
-        random.shuffle(self.cards)
+    # rng is the random.Random to shuffle with (the global one if not given), so a
+    # seeded hand can be dealt again card for card
+    def shuffle(self, rng=None):
+        (rng or random).shuffle(self.cards)
 
     def deal(self, num=1):
-        dealt = [self.cards.pop() for _ in range(num)]
+        # cards come off the end, top card first; slicing from len - num rather than
+        # -num keeps deal(0) from taking the whole deck
+        start = max(0, len(self.cards) - num)
+        dealt = self.cards[start:]
+        dealt.reverse()
+        del self.cards[start:]
         return dealt
 
     def __len__(self):
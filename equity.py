@@ -0,0 +1,328 @@
+"""
+CS 3050 Poker Game - equity.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import collections
+import functools
+import itertools
+import math
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import rankings
+
+DEFAULT_SAMPLES = 20000
+DEFAULT_TIME_BUDGET = 0.5  # seconds
+BATCH_SIZE = 4096
+EXACT_CACHE_SIZE = 4096
+EXACT_CHUNK = 200000  # runouts scored per rank_hands_batch call when enumerating
+EXACT_INLINE_LIMIT = 20000  # runouts small enough to enumerate right on the event loop
+POLL_INTERVAL = 0.05  # seconds between checks for finished live equity requests
+
+
+# Captures what the equity engine needs from a game: the hands still live, the board,
+# and the cards that are known to be out of the deck (folded hands).  Burned cards were
+# never seen by anyone, so they stay in the pool of unseen cards.
+def snapshot_game(game):
+    live = [p for p in game.players.values() if not p.folded and p.hand]
+    return {
+        "players": [p.uuid for p in live],
+        "hands": [tuple(p.hand) for p in live],
+        "board": tuple(game.community_cards),
+        "dead": tuple(card for p in game.players.values() if p.folded for card in p.hand),
+    }
+
+
+# What one player can see of a snapshot: their own hand and the board.  Everyone else
+# still in becomes an unknown opponent (a random hand per sample), and folded cards
+# stay unseen, so the equity it gives says nothing about cards they can't see.
+def private_snapshot(snapshot, uuid):
+    index = snapshot["players"].index(uuid)
+    return {
+        "players": [uuid],
+        "hands": [snapshot["hands"][index]],
+        "board": snapshot["board"],
+        "dead": (),
+        "opponents": len(snapshot["hands"]) - 1,
+    }
+
+
+def unseen_cards(hands, board, dead):
+    known = set(board).union(dead)
+    for hand in hands:
+        known.update(hand)
+    return [card for card in range(52) if card not in known]
+
+
+# Turns the strengths of every hand over a set of runouts into win / tie counts and
+# equity shares (a tie between k hands is worth 1/k of the pot to each of them)
+def tally(strengths):
+    best = strengths.max(axis=0)
+    is_best = strengths == best
+    best_count = is_best.sum(axis=0)
+    wins = (is_best & (best_count == 1)).sum(axis=1)
+    ties = (is_best & (best_count > 1)).sum(axis=1)
+    shares = (is_best / best_count).sum(axis=1)
+    return wins, ties, shares
+
+
+# Runs in a pool process: deal random runouts (and a random hand for each of the
+# opponents) until the sample count or the time budget is used up.  Returns (samples,
+# wins, ties, shares) with one entry per known hand.
+def _sample_runouts(hands, board, dead, samples, time_budget, seed, opponents=0):
+    import numpy as np
+    deadline = time.monotonic() + time_budget
+    rng = np.random.default_rng(seed)
+    remaining = np.array(unseen_cards(hands, board, dead), dtype=np.int64)
+    needed = 5 - len(board)
+    drawn = needed + 2 * opponents
+
+    wins = np.zeros(len(hands), dtype=np.int64)
+    ties = np.zeros(len(hands), dtype=np.int64)
+    shares = np.zeros(len(hands))
+    done = 0
+    while done < samples and time.monotonic() < deadline:
+        batch = min(BATCH_SIZE, samples - done)
+        if drawn:
+            # a random permutation prefix per row draws the cards without replacement
+            order = np.argpartition(rng.random((batch, len(remaining))), drawn - 1, axis=1)[:, :drawn]
+            cards = remaining[order]
+        else:
+            cards = np.empty((batch, 0), dtype=np.int64)
+        runouts = cards[:, :needed]
+
+        strengths = np.empty((len(hands) + opponents, batch), dtype=np.int32)
+        for i, hand in enumerate(hands):
+            known = np.broadcast_to(np.array(hand + board, dtype=np.int64), (batch, len(hand) + len(board)))
+            strengths[i] = rankings.rank_hands_batch(np.concatenate([known, runouts], axis=1))
+        shown = np.broadcast_to(np.array(board, dtype=np.int64), (batch, len(board)))
+        for i in range(opponents):
+            hole = cards[:, needed + 2 * i:needed + 2 * i + 2]
+            strengths[len(hands) + i] = rankings.rank_hands_batch(np.concatenate([hole, shown, runouts], axis=1))
+
+        # only the known hands are reported; the opponents just have to be beaten
+        batch_wins, batch_ties, batch_shares = tally(strengths)
+        wins += batch_wins[:len(hands)]
+        ties += batch_ties[:len(hands)]
+        shares += batch_shares[:len(hands)]
+        done += batch
+    return done, wins.tolist(), ties.tolist(), shares.tolist()
+
+
+def combine(players, results):
+    samples = sum(result[0] for result in results)
+    equity = {}
+    for i, uuid in enumerate(players):
+        wins = sum(result[1][i] for result in results)
+        ties = sum(result[2][i] for result in results)
+        shares = sum(result[3][i] for result in results)
+        equity[uuid] = {
+            "win": wins / samples if samples else 0.0,
+            "tie": ties / samples if samples else 0.0,
+            "equity": shares / samples if samples else 0.0,
+        }
+    return {"samples": samples, "equity": equity}
+
+
+# -------------------- Exact Enumeration --------------------
+def runout_count(snapshot):
+    unseen = len(unseen_cards(snapshot["hands"], snapshot["board"], snapshot["dead"]))
+    return math.comb(unseen, 5 - len(snapshot["board"]))
+
+
+# Hands, board and dead cards are order independent, and so is which seat holds which
+# hand, so sorting them gives one cache key for every way the same situation can be
+# dealt.  Returns (key, order): the key's hands are the snapshot's hands in that order.
+def canonical_key(snapshot):
+    hands = [tuple(sorted(hand)) for hand in snapshot["hands"]]
+    order = sorted(range(len(hands)), key=hands.__getitem__)
+    key = (tuple(hands[i] for i in order),
+           tuple(sorted(snapshot["board"])),
+           tuple(sorted(snapshot["dead"])))
+    return key, order
+
+
+@functools.lru_cache(maxsize=EXACT_CACHE_SIZE)
+def _enumerate_runouts(hands, board, dead):
+    import numpy as np
+    remaining = unseen_cards(hands, board, dead)
+    needed = 5 - len(board)
+    total = math.comb(len(remaining), needed)
+
+    wins = np.zeros(len(hands), dtype=np.int64)
+    ties = np.zeros(len(hands), dtype=np.int64)
+    shares = np.zeros(len(hands))
+    runouts = itertools.combinations(remaining, needed)
+    done = 0
+    while done < total:
+        batch = min(EXACT_CHUNK, total - done)
+        chunk = np.fromiter(itertools.chain.from_iterable(itertools.islice(runouts, batch)),
+                            dtype=np.int64, count=batch * needed).reshape(batch, needed)
+        strengths = np.empty((len(hands), batch), dtype=np.int32)
+        for i, hand in enumerate(hands):
+            known = np.broadcast_to(np.array(hand + board, dtype=np.int64), (batch, len(hand) + len(board)))
+            strengths[i] = rankings.rank_hands_batch(np.concatenate([known, chunk], axis=1))
+        batch_wins, batch_ties, batch_shares = tally(strengths)
+        wins += batch_wins
+        ties += batch_ties
+        shares += batch_shares
+        done += batch
+    return done, tuple(wins.tolist()), tuple(ties.tolist()), tuple(shares.tolist())
+
+
+# Exact equity by scoring every remaining board, for when no more betting can happen
+# (everyone left is all-in).  Results are cached by canonical_key.
+def exact_equity(snapshot):
+    key, order = canonical_key(snapshot)
+    # the cached counts are in key order; line the players up with them, then put the
+    # results back in seat order
+    result = combine([snapshot["players"][i] for i in order], [_enumerate_runouts(*key)])
+    result["equity"] = {uuid: result["equity"][uuid] for uuid in snapshot["players"]}
+    result["exact"] = True
+    return result
+
+
+# Monte Carlo equity for in-progress hands, sampled across a process pool.  While
+# betting is open a player must only see private_snapshot equity (their hand against
+# unknown opponents); equity between the real hands is for once they are all-in.
+# equity() blocks the calling thread until every worker is done, so inside the
+# eventlet server it is run through eventlet.tpool (see app.py).
+class EquityService:
+    def __init__(self, workers=None, samples=DEFAULT_SAMPLES, time_budget=DEFAULT_TIME_BUDGET):
+        self.workers = workers or int(os.environ.get("EQUITY_WORKERS", 0)) or os.cpu_count() or 1
+        self.samples = samples
+        self.time_budget = time_budget
+        self.executor = None
+        self.seed = int.from_bytes(os.urandom(4), "little")
+
+    # The pool is created on first use so importing the server stays cheap.  Workers are
+    # spawned rather than forked so they never inherit the eventlet hub.
+    def _pool(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def submit(self, snapshot, samples=None, time_budget=None):
+        samples = samples or self.samples
+        time_budget = time_budget or self.time_budget
+        per_worker = -(-samples // self.workers)
+        pool = self._pool()
+        futures = []
+        for _ in range(self.workers):
+            self.seed += 1
+            futures.append(pool.submit(_sample_runouts, snapshot["hands"], snapshot["board"], snapshot["dead"],
+                                       per_worker, time_budget, self.seed, snapshot.get("opponents", 0)))
+        return futures
+
+    def equity(self, snapshot, samples=None, time_budget=None):
+        return self.equities([snapshot], samples, time_budget)[0]
+
+    # One result per snapshot (usually one private_snapshot per player), all submitted
+    # before any is waited on.  The time budget is shared between them.
+    def equities(self, snapshots, samples=None, time_budget=None):
+        time_budget = (time_budget or self.time_budget) / max(1, len(snapshots))
+        pending = []
+        for snapshot in snapshots:
+            if len(snapshot["hands"]) + snapshot.get("opponents", 0) < 2:
+                pending.append((snapshot, None))
+            else:
+                pending.append((snapshot, self.submit(snapshot, samples, time_budget)))
+        results = []
+        for snapshot, futures in pending:
+            if futures is None:
+                results.append({"samples": 0, "equity": {uuid: {"win": 1.0, "tie": 0.0, "equity": 1.0}
+                                                         for uuid in snapshot["players"]}})
+            else:
+                results.append(combine(snapshot["players"], [future.result() for future in futures]))
+        return results
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+# -------------------- Live Requests --------------------
+class EquityRequest:
+    def __init__(self, key, views, tag):
+        self.key = key
+        self.views = views
+        self.tag = tag  # whatever the caller needs to tell whether the result is still wanted
+        self.futures = []  # one list of pool futures per view
+        self.superseded = False
+
+
+# Live equity for every table over one EquityService, without holding a thread per
+# request.  A table has at most one request in the pool: a newer one cancels the jobs of
+# the running request that have not started and waits for the rest to drain, and a
+# newer one still replaces it, so only the latest street of a table is computed.  Pool
+# threads only append to a deque; poll() runs on the event loop and hands back results.
+class LiveEquity:
+    def __init__(self, service):
+        self.service = service
+        self.running = {}  # key (the table) -> EquityRequest in the pool
+        self.waiting = {}  # key -> EquityRequest to submit once the running one is done
+        self.finished = collections.deque()  # requests with a finished job, from pool threads
+        self.polling = False
+
+    def request(self, key, views, tag):
+        request = EquityRequest(key, views, tag)
+        running = self.running.get(key)
+        if running is None:
+            self._submit(request)
+            return
+        running.superseded = True
+        for futures in running.futures:
+            for future in futures:
+                future.cancel()
+        self.waiting[key] = request
+
+    def _submit(self, request):
+        self.running[request.key] = request
+        time_budget = self.service.time_budget / max(1, len(request.views))
+        request.futures = [self.service.submit(view, time_budget=time_budget) for view in request.views]
+        for futures in request.futures:
+            for future in futures:
+                future.add_done_callback(lambda _, request=request: self.finished.append(request))
+
+    # [(request, one result per view)] for the requests that finished since the last call
+    def poll(self):
+        results = []
+        while self.finished:
+            request = self.finished.popleft()
+            futures = [future for view_futures in request.futures for future in view_futures]
+            # every job appends the request once; it is done when the last one has
+            if self.running.get(request.key) is not request or not all(future.done() for future in futures):
+                continue
+            del self.running[request.key]
+            if not request.superseded and not any(future.cancelled() or future.exception() for future in futures):
+                results.append((request, [combine(view["players"], [future.result() for future in view_futures])
+                                          for view, view_futures in zip(request.views, request.futures)]))
+            waiting = self.waiting.pop(request.key, None)
+            if waiting is not None:
+                self._submit(waiting)
+        return results
+
+    # Calls on_result(request, results) for every finished request from a background
+    # task of the caller's event loop, started on first use (socketio.start_background_task
+    # / socketio.sleep on the server)
+    def start(self, start_task, sleep, on_result, interval=POLL_INTERVAL):
+        if self.polling:
+            return
+        self.polling = True
+        start_task(self._poll_loop, sleep, on_result, interval)
+
+    def _poll_loop(self, sleep, on_result, interval):
+        while True:
+            sleep(interval)
+            for request, results in self.poll():
+                try:
+                    on_result(request, results)
+                except Exception:
+                    # one table's bad result must not stop every other table's equity
+                    traceback.print_exc()
@@ -0,0 +1,145 @@
+"""
+CS 3050 Poker Game - eventlog.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Structured server log, one JSON object per line:
+
+  {"time": 1700000000.123, "level": "info", "event": "player_seated", "table": "7", "worker": "local", ...}
+
+event() only checks the level and puts a tuple on a bounded queue; turning records into
+JSON and writing them happens in batches on the log's own thread, so handlers never wait
+on stdout.  When the queue is full records are dropped and counted, and the writer
+reports how many it lost.
+
+  LOG_LEVEL=debug                        # level for every table (default info)
+  LOG_TABLE_LEVELS="7=debug,lobby=error" # per table overrides
+  LOG_FILE=server.log                    # append here instead of stdout
+"""
+
+import json
+import os
+import sys
+import time
+
+try:
+    # a real OS thread and queue even when eventlet has patched the stdlib
+    from eventlet.patcher import original
+    threading = original("threading")
+    queue = original("queue")
+except ImportError:
+    import queue
+    import threading
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+QUEUE_SIZE = 10000  # records waiting for the writer before new ones are dropped
+
+
+def parse_level(name, default=INFO):
+    return LEVELS.get(str(name).strip().lower(), default) if name else default
+
+
+# "7=debug,lobby=error" -> {"7": DEBUG, "lobby": ERROR}
+def parse_table_levels(text):
+    levels = {}
+    for entry in filter(None, (text or "").split(",")):
+        table_id, _, level = entry.partition("=")
+        levels[table_id.strip()] = parse_level(level)
+    return levels
+
+
+class EventLog:
+    # stream is any text file; context fields (the worker id) go on every record
+    def __init__(self, stream=None, level=INFO, table_levels=None, context=None, queue_size=QUEUE_SIZE):
+        self.stream = stream or sys.stdout
+        self.level = level
+        self.table_levels = dict(table_levels or {})
+        self.context = dict(context or {})
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self.thread.start()
+
+    # LOG_LEVEL, LOG_TABLE_LEVELS and LOG_FILE from the environment
+    @classmethod
+    def from_environment(cls, context=None):
+        path = os.environ.get("LOG_FILE")
+        stream = open(path, "a", buffering=1) if path else None
+        return cls(stream, parse_level(os.environ.get("LOG_LEVEL")),
+                   parse_table_levels(os.environ.get("LOG_TABLE_LEVELS")), context)
+
+    # -------------------- Levels --------------------
+    # table None sets the level every table without its own override uses
+    def set_level(self, level, table_id=None):
+        if table_id is None:
+            self.level = level
+        else:
+            self.table_levels[str(table_id)] = level
+
+    def clear_level(self, table_id):
+        self.table_levels.pop(str(table_id), None)
+
+    def enabled(self, level, table_id=None):
+        return level >= self.table_levels.get(table_id, self.level)
+
+    # -------------------- Recording --------------------
+    # Queues one record.  Field values are kept as they are until the writer formats
+    # them, so pass values that won't change afterwards (strings, numbers, fresh lists).
+    def event(self, level, event, table_id=None, **fields):
+        if level < self.table_levels.get(table_id, self.level):
+            return
+        try:
+            self.queue.put_nowait((time.time(), level, event, table_id, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def debug(self, event, table_id=None, **fields):
+        self.event(DEBUG, event, table_id, **fields)
+
+    def info(self, event, table_id=None, **fields):
+        self.event(INFO, event, table_id, **fields)
+
+    def warning(self, event, table_id=None, **fields):
+        self.event(WARNING, event, table_id, **fields)
+
+    def error(self, event, table_id=None, **fields):
+        self.event(ERROR, event, table_id, **fields)
+
+    # Writes out everything queued so far and stops the writer
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    # -------------------- Writer thread --------------------
+    def _format(self, record):
+        timestamp, level, event, table_id, fields = record
+        line = {"time": round(timestamp, 3), "level": LEVEL_NAMES.get(level, level), "event": event}
+        if table_id is not None:
+            line["table"] = table_id
+        line.update(self.context)
+        line.update(fields)
+        return json.dumps(line, separators=(",", ":"), default=str)
+
+    def _run(self):
+        reported = 0
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [self._format(record) for record in batch if record is not None]
+            if self.dropped != reported:
+                # read once; event() keeps counting while this is written
+                dropped = self.dropped
+                lines.append(self._format((time.time(), WARNING, "log_dropped", None,
+                                           {"records": dropped - reported})))
+                reported = dropped
+            if lines:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            if None in batch:
+                return
@@ -0,0 +1,53 @@
+"""
+CS 3050 Poker Game - frames.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import wire
+
+
+# Collects every event one state transition produces at a table (public ones for the
+# whole table, private ones such as hole cards and available actions for one player)
+# and sends them as a single "frame" per player, so a click costs one message per seat.
+# Events keep the order they were added in; the client replays them through its
+# normal handlers.
+class Frame:
+    def __init__(self, table):
+        self.table = table
+        self.events = []  # (uuid or None for everyone, event, data)
+
+    def add(self, event, data):
+        self.events.append((None, event, data))
+
+    def add_private(self, uuid, event, data):
+        self.events.append((uuid, event, data))
+
+    def __bool__(self):
+        return bool(self.events)
+
+    def events_for(self, uuid):
+        return [[event, data] for recipient, event, data in self.events if recipient is None or recipient == uuid]
+
+    # send(event, data, to=sid) is socketio.emit; works from handlers and background tasks.
+    # encodings maps a player to the wire encoding they negotiated (JSON if missing).
+    # meter(event, size) hears of every event once per player it reaches, with its size
+    # in that player's encoding (worked out once per event and encoding).
+    def flush(self, send, encodings=None, meter=None):
+        if not self.events:
+            return
+        encodings = encodings or {}
+        sizes = {}  # (position in self.events, encoding) -> bytes
+        for uuid in list(self.table.seat_of):
+            encoding = encodings.get(uuid, wire.JSON)
+            events = self.events_for(uuid)
+            if not events:
+                continue
+            send("frame", wire.encode_frame(events, encoding), to=uuid)
+            if meter is not None:
+                for position, (recipient, event, data) in enumerate(self.events):
+                    if recipient is None or recipient == uuid:
+                        size = sizes.get((position, encoding))
+                        if size is None:
+                            size = sizes[(position, encoding)] = wire.event_size(event, data, encoding)
+                        meter(event, size)
+        self.events = []
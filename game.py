@@ -3,40 +3,161 @@ CS 3050 Poker Game - game.py
 Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
 """
 
+import bisect
+import random
+
 import deck
 import Player
 import Pot
 import rankings
 
 
-class PokerGame:
+ANTE = 10  # chips every player puts in before the deal, unless the table plays another stake
+MAXIMUM_BET = 990  # a new table's bet limit; it only comes down from here (see _update_maximum_bet)
+MAX_SEATS = 10  # per-seat arrays start this long and grow if a table ever seats more
+SEED_MASK = (1 << 64) - 1
+
 
-    def __init__(self):
+# Copy of mapping with one key renamed, keeping the insertion order
+def _rekey(mapping, old_key, new_key):
+    return {new_key if key == old_key else key: value for key, value in mapping.items()}
+
+
+class PokerGame:
+    __slots__ = ("players", "seat_players", "occupied", "seats", "deck", "pot", "community_cards", "turn_order",
+                 "current_turn_index", "round_active", "seed_state", "hand_seed", "current_bet",
+                 "minimum_raise", "maximum_bet", "ante", "street", "last_aggressor", "contenders", "active",
+                 "pending", "live", "chips_dirty", "last_actor", "state_version", "published_state",
+                 "history")
+
+    # seed fixes the stream every hand's seed is drawn from (random if not given)
+    def __init__(self, seed=None):
+        # Players by uuid, in the order they sat down, and by seat index: the slot their
+        # chips, street bet and folded / acted flags have in self.seats
         self.players = {}
+        self.seat_players = [None] * MAX_SEATS
+        self.occupied = []  # taken seat indexes, ascending
+        self.seats = Player.Seats(MAX_SEATS)
         self.deck = deck.Deck()
         self.pot = Pot.Pot()
         self.community_cards = []
 
-        # Turn order
+        # Turn order, as seat indexes
         self.turn_order = []
         self.current_turn_index = 0
         self.round_active = False
 
-        # Betting state
+        # Every hand is shuffled by its own seed, so it can be dealt again from the
+        # seed and replayed from its actions (see replay.py).  Hand seeds come from a
+        # splitmix64 counter, a single int per table instead of a whole random.Random.
+        self.seed_state = random.getrandbits(64) if seed is None else seed & SEED_MASK
+        self.hand_seed = None
+
+        # Betting state (each player's bet on this street is self.seats.bets)
         self.current_bet = 0
-        self.street_contributions = {}
         self.minimum_raise = 0
-        self.maximum_bet = 990
+        self.maximum_bet = MAXIMUM_BET
+        self.ante = ANTE  # the table's stake; also the minimum bet and raise
         self.street = "preflop"  # preflop, flop, turn, river, showdown
         self.last_aggressor = None  # Last person to have set a new high
 
+        # Kept up to date action by action so no betting check scans the table (see
+        # rebuild_betting_state): seated players who have not folded, those of them who
+        # still have chips, those of them who still have to act, and the seats in the
+        # ring of live seats.  maximum_bet only needs the chips that changed since the
+        # last action: the last actor's, or everyone's when chips_dirty.
+        self.contenders = 0
+        self.active = 0
+        self.pending = 0
+        self.live = 0
+        self.chips_dirty = True
+        self.last_actor = None
+
+        # Published state versions (see publish_state_delta)
+        self.state_version = 0
+        self.published_state = None
+
+        # handhistory.HandRecorder when this table's hands are being logged
+        self.history = None
+
     # -------------------- Player Management --------------------
-    def add_player(self, name, uuid, seat_position, seat_position_flag, is_ready):
-        self.players[uuid] = Player.Player(name, uuid, seat_position, seat_position_flag, is_ready)
+    # index picks the seat index (a restored table keeps its old ones), the lowest free one otherwise
+    def add_player(self, name, uuid, seat_position, seat_position_flag, is_ready, index=None):
+        self.remove_player(uuid)
+        if index is None:
+            index = self._free_index()
+        while index >= len(self.seat_players):
+            self._grow()
+        player = Player.Player(name, uuid, seat_position, seat_position_flag, is_ready, self.seats, index)
+        self.players[uuid] = player
+        self.seat_players[index] = player
+        bisect.insort(self.occupied, index)
+        self.rebuild_betting_state()
 
     def remove_player(self, uuid):
-        if uuid in self.players:
-            del self.players[uuid]
+        player = self.players.pop(uuid, None)
+        if player is not None:
+            self.seat_players[player.index] = None
+            self.occupied.remove(player.index)
+            self.seats.clear(player.index)
+            self.rebuild_betting_state()
+
+    # Replaces everyone at the table in one go with seats [(name, uuid, seat_position,
+    # chips)] in seat indexes 0, 1, ... as add_player would give a new table, with a new
+    # table's bet limit; the Player objects already there are reused and the betting
+    # state is rebuilt once.  For replaying many hands on one game (see replay.py).
+    def reseat(self, seats):
+        spare = {player.index: player for player in self.players.values()}
+        for index in self.occupied:
+            self.seat_players[index] = None
+            self.seats.clear(index)
+        self.players = {}
+        self.occupied = []
+        for index, (name, uuid, seat_position, chips) in enumerate(seats):
+            while index >= len(self.seat_players):
+                self._grow()
+            player = spare.get(index)
+            if player is None:
+                player = Player.Player(name, uuid, seat_position, 0, True, self.seats, index)
+            else:
+                player.name, player.uuid, player.seat_position = name, uuid, seat_position
+            player.chips = chips
+            self.players[uuid] = player
+            self.seat_players[index] = player
+            self.occupied.append(index)
+        self.turn_order = []
+        self.round_active = False
+        self.maximum_bet = MAXIMUM_BET
+        self.rebuild_betting_state()
+
+    def _free_index(self):
+        for index, player in enumerate(self.seat_players):
+            if player is None:
+                return index
+        self._grow()
+        return self._free_index()
+
+    def _grow(self):
+        size = len(self.seat_players)
+        self.seat_players.extend([None] * size)
+        self.seats.grow(size * 2)
+
+    def street_contribution(self, uuid):
+        player = self.players.get(uuid)
+        return self.seats.bets[player.index] if player is not None else 0
+
+    # A player who reconnects gets a new socket id; everything keyed by the old one is
+    # moved over in place, so seat order and the hand in progress are unchanged
+    def rekey_player(self, old_uuid, new_uuid):
+        if old_uuid not in self.players:
+            return
+        self.players[old_uuid].uuid = new_uuid
+        self.players = _rekey(self.players, old_uuid, new_uuid)
+        self.pot.contributions = _rekey(self.pot.contributions, old_uuid, new_uuid)
+        if self.last_aggressor == old_uuid:
+            self.last_aggressor = new_uuid
+        if self.history is not None:
+            self.history.rekey(old_uuid, new_uuid)
 
     # -------------------- Ready System --------------------
     def set_ready(self, uuid, is_ready: bool):
@@ -61,48 +182,63 @@ class PokerGame:
         return len(self.players) > 0 and all(getattr(p, "ready", False) for p in self.players.values())
 
     # -------------------- Round Management --------------------
-    def start_round(self):
+    # hand_seed replays a particular deal; normally the next one is drawn from the seed stream
+    def start_round(self, hand_seed=None):
         for player in self.players.values():
             player.reset_for_round()
 
-        self.deck = deck.Deck()
-        self.deck.shuffle()
+        self.hand_seed = self._next_hand_seed() if hand_seed is None else hand_seed
+        self.deck.reset()
+        self.deck.shuffle(random.Random(self.hand_seed))
         self.pot.clear_pot()
         self.community_cards = []
 
         # Turn order: Player 1 always starts preflop
-        self.turn_order = list(self.players.keys())
+        self.turn_order = [player.index for player in self.players.values()]
         self.current_turn_index = 0
         self.round_active = True
         self.street = "preflop"
 
         # Betting state
         self.current_bet = 0
-        self.minimum_raise = 10
-        self.street_contributions = {uuid: 0 for uuid in self.players.keys()}
+        self.minimum_raise = self.ante
+        self.seats.new_street()
         self.last_aggressor = None
 
         # Deal 2 cards to each player
+        bets = self.seats.bets
         for player in self.players.values():
             player.receive_card(self.deck.deal(2))
             # Simple ante
-            ante = 10
+            ante = self.ante
             player.chips -= ante
-            self.pot.add_to_pot(ante)
-            self.street_contributions[player.uuid] = ante
-            player.acted_this_round = False
+            self.pot.add_to_pot(ante, player.uuid)
+            bets[player.index] = ante
+        self.rebuild_betting_state()
+
+        if self.history is not None:
+            self.history.start_hand(self)
+
+    # Next hand seed from the table's splitmix64 stream
+    def _next_hand_seed(self):
+        self.seed_state = (self.seed_state + 0x9E3779B97F4A7C15) & SEED_MASK
+        z = self.seed_state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & SEED_MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & SEED_MASK
+        return z ^ (z >> 31)
 
     def reset_round(self):
 
         self.round_active = False
-        self.deck = deck.Deck()
+        self.deck.reset()
         self.deck.shuffle()
         self.pot.clear_pot()
         self.community_cards.clear()
-        self.turn_order = list(self.players.keys())
+        self.turn_order = [player.index for player in self.players.values()]
         self.current_turn_index = 0
         self.last_aggressor = None
         self.street = "preflop"
+        self.rebuild_betting_state()
 
     # Disconnect helper
     def on_disconnect(self, uuid):
@@ -110,12 +246,12 @@ class PokerGame:
         if uuid not in self.players:
             return out
 
-        # Remove per-street contribution
-        self.street_contributions.pop(uuid, None)
-
-        # Remove from turn order and fix index
-        if uuid in self.turn_order:
-            idx = self.turn_order.index(uuid)
+        # Remove from turn order and fix index (the street contribution goes with the seat)
+        index = self.players[uuid].index
+        if self.round_active and self.history is not None and index in self.turn_order:
+            self.history.action(uuid, self.street, "leave", 0)
+        if index in self.turn_order:
+            idx = self.turn_order.index(index)
             self.turn_order.pop(idx)
 
             # If players are in the lobby
@@ -153,7 +289,12 @@ class PokerGame:
 
     # -------------------- Turn Management --------------------
     def current_player(self):
-        return self.players.get(self.turn_order[self.current_turn_index])
+        return self.seat_players[self.turn_order[self.current_turn_index]]
+
+    # Whether the player was dealt into the hand being played
+    def in_hand(self, uuid):
+        player = self.players.get(uuid)
+        return self.round_active and player is not None and self.seats.position[player.index] >= 0
 
     # def has_player_acted_this_round(self, uuid):
     #     curr = self.current_player()
@@ -163,13 +304,16 @@ class PokerGame:
     #         return False
 
 
+    # Next player in turn order who has not folded and has chips (the current one again
+    # if nobody else can act), None if nobody can
     def advance_turn(self):
-        for _ in range(len(self.turn_order)):
-            self.current_turn_index = (self.current_turn_index + 1) % len(self.turn_order)
-            p = self.current_player()
-            if not p.folded and p.chips > 0:
-                return p
-        return None
+        if not self.turn_order:
+            return None
+        index = self._next_live(self.turn_order[self.current_turn_index])
+        if index is None:
+            return None
+        self.current_turn_index = self.seats.position[index]
+        return self.seat_players[index]
 
     def advance_turn_by_1(self):
         self.current_turn_index += 1
@@ -177,58 +321,121 @@ class PokerGame:
     # More disconnect helpers
     def active_players(self):
         # not folded and has chips
-        return [p for p in self.players.values() if not p.folded and p.chips > 0]
-
+        return [self.seat_players[index] for index in self._active_indexes()]
+
+    # Seat indexes of everyone in the hand who has not folded and still has chips
+    def _active_indexes(self):
+        chips, folded = self.seats.chips, self.seats.folded
+        return [index for index in self._betting_seats() if not folded[index] and chips[index] > 0]
+
+    # Seats the betting counts cover: while a hand is played only the ones dealt in (a
+    # player seated mid-hand waits for the next deal), between hands everyone seated
+    def _betting_seats(self):
+        return self.turn_order if self.round_active else self.occupied
+
+
+    # Two or more players are still in the hand but at most one of them can still bet,
+    # so the rest of the board is just dealt out
+    def is_all_in(self):
+        return self.contenders >= 2 and self.active <= 1
+
+    # -------------------- Betting State --------------------
+    # Recounts everything the betting checks keep up to date and relinks the ring of
+    # live seats (dealt in, not folded, chips left) in turn order.  The counters only
+    # cover _betting_seats, so a player seated mid-hand is left out until the next deal.
+    # Runs whenever seats, chips or the turn order change outside an action: dealing,
+    # showdown, players joining or leaving, a restored snapshot.
+    def rebuild_betting_state(self):
+        seats = self.seats
+        chips, folded, bets, acted, epoch = seats.chips, seats.folded, seats.bets, seats.acted, seats.epoch
+        self.contenders = self.active = self.pending = 0
+        for index in self._betting_seats():
+            if folded[index]:
+                continue
+            self.contenders += 1
+            if chips[index] > 0:
+                self.active += 1
+                if acted[index] != epoch or bets[index] < self.current_bet:
+                    self.pending += 1
+
+        position, after, before = seats.position, seats.after, seats.before
+        for index in range(len(position)):
+            position[index] = -1
+        order = self.turn_order
+        live = []
+        for turn, index in enumerate(order):
+            position[index] = turn
+            if not folded[index] and chips[index] > 0:
+                live.append(index)
+        self.live = len(live)
+        for turn, index in enumerate(live):
+            after[index] = live[(turn + 1) % len(live)]
+            before[index] = live[turn - 1]
+        # a seat out of the ring points at the next live seat after it
+        if live:
+            following = live[0]
+            for index in reversed(order + order):
+                if not folded[index] and chips[index] > 0:
+                    following = index
+                else:
+                    after[index] = following
+        self.chips_dirty = True
+        self.last_actor = None
+
+    # First live seat after index in turn order (index itself if it is the only one),
+    # None when nobody is left to act
+    def _next_live(self, index):
+        if not self.live:
+            return None
+        seats = self.seats
+        chips, folded, after = seats.chips, seats.folded, seats.after
+        if not folded[index] and chips[index] > 0:
+            return after[index]
+        # seats leave the ring pointing at their successor, which may have left since
+        following = after[index]
+        while folded[following] or chips[following] <= 0:
+            following = after[following]
+        after[index] = following
+        return following
+
+    def _unlink(self, index):
+        after, before = self.seats.after, self.seats.before
+        self.live -= 1
+        if self.live:
+            after[before[index]] = after[index]
+            before[after[index]] = before[index]
 
     # ------------------Game Logic Helpers--------------
 
     def assign_hand_ranking(self):
         for player in self.players.values():
-            player.set_hand_rank(rankings.rank_hand(player.hand + self.community_cards))
-
-    def rank_all_player_hands(self):  # TODO: make less stupid / complex
-        winning_players = []
-        current_best_rank = 0
-        high_card_of_current_best = 0
-        best_first_pair = 0
-        best_second_pair = 0
-
-        list_of_eligible_players = [p for p in self.players.values() if not p.folded] # only poll from players that haven't folded
-        for player in list_of_eligible_players:
-            player_hand_rank = player.hand_rank[0]
-            player_high_cards = player.hand_rank[1]
-            if player_hand_rank > current_best_rank:  # this player is the new current winner
-                current_best_rank = player_hand_rank
-
-                if player_hand_rank == 3 or player_hand_rank == 7:
-                    best_first_pair, best_second_pair = player_high_cards
-                else:
-                    high_card_of_current_best = player_high_cards
-                winning_players = [player]
-                if player_hand_rank == 3 or player_hand_rank == 7:
-                    best_first_pair, best_second_pair = player_high_cards
-
-            elif player_hand_rank == current_best_rank:  # there is a ranking tie, now check high card(s)
-                if player_hand_rank == 3 or player_hand_rank == 7:
-                    if player_high_cards[0] > best_first_pair:  # a better dominant pair
-                        winning_players = [player]
-                        best_first_pair, best_second_pair = player_high_cards
-                    elif player_high_cards[0] == best_first_pair:  # equal dominant pair, check secondary pair
-                        if player_high_cards[1] > best_second_pair:
-                            winning_players = [player]
-                            best_second_pair = player_high_cards[1]
-                        elif player_high_cards[1] == best_second_pair:
-                            winning_players.append(player)
-                elif player_high_cards > high_card_of_current_best:
-                    winning_players = [player]
-                elif player_high_cards == high_card_of_current_best:
-                    winning_players.append(player)
-
-        return current_best_rank, winning_players
-
+            player.update_hand_rank()
+
+    # Returns the best hand ranking among players still in and everyone holding it
+    def rank_all_player_hands(self):
+        folded, seat_players = self.seats.folded, self.seat_players
+        eligible = [seat_players[index] for index in self.turn_order if not folded[index]]  # only poll from players that haven't folded
+        if not eligible:
+            return 0, []
+        best_strength = max(p.hand_strength for p in eligible)
+        winning_players = [p for p in eligible if p.hand_strength == best_strength]
+        return rankings.strength_to_rank(best_strength)[0], winning_players
+
+    # Ranks every hand still in and pays out the main pot and any side pots in one pass
+    def showdown(self):
+        self.assign_hand_ranking()
+        # a player seated mid-hand holds no cards, only the board
+        dealt_in = [self.seat_players[index] for index in self.turn_order]
+        contenders = [p for p in dealt_in if not p.folded]
+        result = self.pot.award(contenders, [p.uuid for p in dealt_in])
+        self.rebuild_betting_state()
+        if self.history is not None:
+            self.history.finish_hand(self, result["payouts"])
+        return result
+
+    # Everyone has to act again except the aggressor (one epoch step, see Player.Seats)
     def reset_actions_after_aggression(self, aggressor_uuid):
-        for player in self.players.values():
-            player.acted_this_round = False
+        self.seats.clear_acted()
         self.players[aggressor_uuid].acted_this_round = True
         self.last_aggressor = aggressor_uuid
 
@@ -238,47 +445,98 @@ class PokerGame:
         if not self.turn_order:
             return 0
         while True:
-            candidate = self.players[self.turn_order[idx]]
-            if not candidate.folded:
+            if not self.seats.folded[self.turn_order[idx]]:
                 return idx
             idx = (idx + 1) % len(self.turn_order)
 
     # -------------------- Betting --------------------
+    # Applies one action and logs it (with the chips it actually put in) to the hand history
     def apply_action(self, uuid, action, amount=0):
-        # determine maximum bet
-        for player in self.players.values():
-            if player.chips < self.maximum_bet:
-                self.maximum_bet = player.chips
-
-        p = self.players.get(uuid)
-        if not p or p.folded or p.chips == 0:
+        before = self.pot.contributions.get(uuid, 0)
+        self._update_maximum_bet()
+        player = self.players.get(uuid)
+        if player is None or self.seats.position[player.index] < 0:
+            # not seated, or seated after the deal
+            self.last_actor = None
+            return False, "Invalid player state."
+        seat = self.last_actor = player.index
+        seats = self.seats
+        epoch = seats.epoch
+        was_live = not seats.folded[seat] and seats.chips[seat] > 0
+        was_pending = was_live and (seats.acted[seat] != epoch or seats.bets[seat] < self.current_bet)
+
+        ok, message = self._apply_action(uuid, action, amount)
+        if ok:
+            self._settle_action(seat, was_live, was_pending, epoch)
+        if ok and self.history is not None:
+            self.history.action(uuid, self.street, action, self.pot.contributions.get(uuid, 0) - before)
+        return ok, message
+
+    # maximum_bet never goes up: it is the fewest chips any seated player has had when
+    # an action was taken.  Between two actions only the last actor's chips can have
+    # dropped, unless something outside the betting changed chips (chips_dirty).
+    def _update_maximum_bet(self):
+        chips = self.seats.chips
+        if self.chips_dirty:
+            for index in self.occupied:
+                if chips[index] < self.maximum_bet:
+                    self.maximum_bet = chips[index]
+            self.chips_dirty = False
+        elif self.last_actor is not None and chips[self.last_actor] < self.maximum_bet:
+            self.maximum_bet = chips[self.last_actor]
+
+    # Brings the counters and the ring up to date after one player's action
+    def _settle_action(self, seat, was_live, was_pending, epoch):
+        seats = self.seats
+        folded = seats.folded[seat]
+        live = not folded and seats.chips[seat] > 0
+        if was_live and not live:
+            self.active -= 1
+            if seats.position[seat] >= 0:
+                self._unlink(seat)
+        if folded:
+            self.contenders -= 1
+        pending = live and (seats.acted[seat] != seats.epoch or seats.bets[seat] < self.current_bet)
+        if seats.epoch != epoch:
+            # an aggressive action: everyone else still in has to act again
+            self.pending = self.active - live + pending
+        else:
+            self.pending += pending - was_pending
+
+    def _apply_action(self, uuid, action, amount=0):
+        p = self.players[uuid]
+        # this player's slot in the seat arrays
+        seat = p.index
+        seats = self.seats
+        chips, bets = seats.chips, seats.bets
+        if seats.folded[seat] or chips[seat] == 0:
             return False, "Invalid player state."
 
-        my_contribution = self.street_contributions.get(uuid, 0)
+        my_contribution = bets[seat]
         price_to_call = max(0, self.current_bet - my_contribution)
 
         # ---------------- FOLD ----------------
         if action == "fold":
-            p.folded = True
-            p.acted_this_round = True
+            seats.folded[seat] = True
+            seats.acted[seat] = seats.epoch
             return True, f"{p.name} folded."
 
         # ---------------- CHECK ----------------
         if action == "check":
             if price_to_call > 0:
                 return False, "Cannot check facing a bet."
-            p.acted_this_round = True
+            seats.acted[seat] = seats.epoch
             return True, f"{p.name} checked."
 
         # ---------------- CALL ----------------
         if action == "call":
             if price_to_call == 0:
                 return False, "Nothing to call."
-            to_put = min(price_to_call, p.chips)
-            p.chips -= to_put
-            self.pot.add_to_pot(to_put)
-            self.street_contributions[uuid] = my_contribution + to_put
-            p.acted_this_round = True
+            to_put = min(price_to_call, chips[seat])
+            chips[seat] -= to_put
+            self.pot.add_to_pot(to_put, uuid)
+            bets[seat] = my_contribution + to_put
+            seats.acted[seat] = seats.epoch
             return True, f"{p.name} called."
 
         # ---------------- BET ----------------
@@ -287,14 +545,14 @@ class PokerGame:
                 return False, "Bet not allowed; use raise."
             if amount < self.minimum_raise:
                 return False, f"Minimum bet is {self.minimum_raise}."
-            if amount > p.chips:
+            if amount > chips[seat]:
                 return False, "Not enough chips."
             if amount > self.maximum_bet:
                 return False, "Bet is more than the least common denominator."
-            p.chips -= amount
-            self.pot.add_to_pot(amount)
-            self.street_contributions[uuid] = my_contribution + amount
-            self.current_bet = self.street_contributions[uuid]
+            chips[seat] -= amount
+            self.pot.add_to_pot(amount, uuid)
+            bets[seat] = my_contribution + amount
+            self.current_bet = bets[seat]
             self.reset_actions_after_aggression(uuid)
             return True, f"{p.name} bet {amount}."
 
@@ -304,87 +562,70 @@ class PokerGame:
                 return False, "Cannot raise when no bet to call."
             raise_over_call = amount
             total_needed = price_to_call + raise_over_call
-            if raise_over_call < self.minimum_raise and p.chips > price_to_call:
+            if raise_over_call < self.minimum_raise and chips[seat] > price_to_call:
                 return False, f"Minimum raise is {self.minimum_raise}."
-            if total_needed > p.chips:
+            if total_needed > chips[seat]:
                 return False, "Not enough chips."
-            p.chips -= total_needed
-            self.pot.add_to_pot(total_needed)
-            self.street_contributions[uuid] = my_contribution + total_needed
-            self.current_bet = self.street_contributions[uuid]
+            chips[seat] -= total_needed
+            self.pot.add_to_pot(total_needed, uuid)
+            bets[seat] = my_contribution + total_needed
+            self.current_bet = bets[seat]
             self.reset_actions_after_aggression(uuid)
             return True, f"{p.name} raised by {raise_over_call}."
 
         # ---------------- ALL-IN ----------------
         if action == "allin":
-            if p.chips == 0:
+            if chips[seat] == 0:
                 return False, "Already all-in."
-            to_put = p.chips
-            p.chips = 0
-            self.pot.add_to_pot(to_put)
-            self.street_contributions[uuid] = my_contribution + to_put
+            to_put = chips[seat]
+            chips[seat] = 0
+            self.pot.add_to_pot(to_put, uuid)
+            bets[seat] = my_contribution + to_put
             # If this all-in sets a new high, it's aggressive
-            if self.street_contributions[uuid] > self.current_bet:
-                self.current_bet = self.street_contributions[uuid]
+            if bets[seat] > self.current_bet:
+                self.current_bet = bets[seat]
                 self.reset_actions_after_aggression(uuid)
                 return True, f"{p.name} went all-in for {to_put}."
             else:
-                p.acted_this_round = True
+                seats.acted[seat] = seats.epoch
                 return True, f"{p.name} called all-in."
 
         return False, "Unknown action."
 
     # Changed to fit with new logic
     def is_betting_round_complete(self):
-        # Get active players (not folded, have chips)
-        active = [p for p in self.players.values() if not p.folded and p.chips > 0]
-
-        # If 0 or 1 active player, round is over
-        if len(active) <= 1:
+        # If 0 or 1 active player (not folded, have chips), round is over
+        if self.active <= 1:
             self.street = "river"
             return True
 
-        # Everyone has acted
-        if not all(p.acted_this_round for p in active):
-            return False
-
-        # Everyone has matched the current bet (or is all-in)
-        for p in active:
-            contribution = self.street_contributions.get(p.uuid, 0)
-            if contribution < self.current_bet:
-                return False
-
-        # All conditions met, round is complete
-        return True
+        # Everyone has acted and matched the current bet (or is all-in)
+        return self.pending == 0
 
     def move_to_next_street(self):
-        # Reset contributions for new street
-        for uuid in self.street_contributions:
-            self.street_contributions[uuid] = 0
+        # Reset contributions and acted_this_round for the new street
+        self.seats.new_street()
         self.current_bet = 0
         self.last_aggressor = None
-
-        # Reset acted_this_round
-        for p in self.players.values():
-            p.acted_this_round = False
+        self.pending = self.active
 
         # Move street
         if self.street == "preflop":
             self.burn_card()
-            self.community_cards.extend(self.deck.deal(3))
+            self.deal_community(3)
             self.street = "flop"
         elif self.street == "flop":
             self.burn_card()
-            self.community_cards.extend(self.deck.deal(1))
+            self.deal_community(1)
             self.street = "turn"
         elif self.street == "turn":
             self.burn_card()
-            self.community_cards.extend(self.deck.deal(1))
+            self.deal_community(1)
             self.street = "river"
 
         # Set current player to first active
         self.current_turn_index = self._first_active_index()
-        while self.current_player().folded or self.current_player().chips == 0:
+        if self.live and self.current_player().chips == 0:
             self.advance_turn()
 
     # -------------------- Available Actions --------------------
@@ -393,7 +634,7 @@ class PokerGame:
         if not p or p.folded:
             return []
 
-        my_contribution = self.street_contributions.get(uuid, 0)
+        my_contribution = self.seats.bets[p.index]
         price_to_call = max(0, self.current_bet - my_contribution)
 
         if p.chips == 0:
@@ -412,45 +653,100 @@ class PokerGame:
 
     # -------------------- Serialize --------------------
     def serialize_game_state(self):
+        chips, folded, bets = self.seats.chips, self.seats.folded, self.seats.bets
         return {
             "players": [
                 {
                     "uuid": p.uuid,
                     "name": p.name,
-                    "chips": p.chips,
-                    "folded": p.folded,
+                    "chips": chips[p.index],
+                    "folded": bool(folded[p.index]),
                     "hand_rank": p.hand_rank[0],
-                    "contribution": self.street_contributions.get(p.uuid, 0)
+                    "contribution": bets[p.index]
                 } for p in self.players.values()
             ],
-            "community_cards": [str(c) for c in self.community_cards],
+            "community_cards": list(self.community_cards),  # codes, wire.py names them for JSON
             "pot": self.pot.amount,
             "current_bet": self.current_bet,
             "street": self.street,
-            "current_turn": self.turn_order[self.current_turn_index] if self.turn_order else None
+            "current_turn": self.seat_players[self.turn_order[self.current_turn_index]].uuid if self.turn_order else None
         }
 
+    # -------------------- State Versions --------------------
+    # Each published change bumps state_version.  Clients apply a delta only on top of
+    # the version it was built from and ask for a full snapshot when they see a gap.
+
+    # Returns {"version", "base", "changes"} with only the fields that changed since the
+    # last published state (players by uuid), or None if nothing changed
+    def publish_state_delta(self):
+        state = self.serialize_game_state()
+        previous = self.published_state or {}
+
+        changes = {key: value for key, value in state.items()
+                   if key != "players" and previous.get(key) != value}
+
+        old_players = {p["uuid"]: p for p in previous.get("players", [])}
+        changed_players = {}
+        for player in state["players"]:
+            old = old_players.pop(player["uuid"], None)
+            if old is None:
+                changed_players[player["uuid"]] = player
+                continue
+            fields = {key: value for key, value in player.items() if old.get(key) != value}
+            if fields:
+                changed_players[player["uuid"]] = fields
+        if changed_players:
+            changes["players"] = changed_players
+        if old_players:
+            changes["removed_players"] = list(old_players)
+
+        if not changes:
+            return None
+        self.state_version += 1
+        self.published_state = state
+        return {"version": self.state_version, "base": self.state_version - 1, "changes": changes}
+
+    # Full state at the latest published version, for joiners and clients that missed a delta
+    def state_snapshot(self):
+        if self.published_state is None:
+            self.publish_state_delta()
+        return dict(self.published_state, version=self.state_version)
+
     # -------------------- Dealing --------------------
     def burn_card(self):
         self.deck.deal(1)
 
+    # Adds cards to the board and to every player's incremental ranking state
+    def deal_community(self, num):
+        cards = self.deck.deal(num)
+        self.community_cards.extend(cards)
+        board_mask = rankings.card_mask(cards)
+        for p in self.players.values():
+            p.receive_board_cards(board_mask)
+
     def deal_flop(self):
         if len(self.community_cards) == 0:
             self.burn_card()
-            self.community_cards.extend(self.deck.deal(3))
-            for p in self.players.values():
-                p.acted_this_round = False
+            self.deal_community(3)
+            self.seats.clear_acted()
+            self.pending = self.active
 
     def deal_turn(self):
         if len(self.community_cards) == 3:
             self.burn_card()
-            self.community_cards.extend(self.deck.deal(1))
-            for p in self.players.values():
-                p.acted_this_round = False
+            self.deal_community(1)
+            self.seats.clear_acted()
+            self.pending = self.active
 
     def deal_river(self):
         if len(self.community_cards) == 4:
             self.burn_card()
-            self.community_cards.extend(self.deck.deal(1))
-            for p in self.players.values():
-                p.acted_this_round = False
+            self.deal_community(1)
+            self.seats.clear_acted()
+            self.pending = self.active
+
+    # Deal whatever is left of the board (all-in runout)
+    def deal_runout(self):
+        self.deal_flop()
+        self.deal_turn()
+        self.deal_river()
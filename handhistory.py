@@ -0,0 +1,307 @@
+"""
+CS 3050 Poker Game - handhistory.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Every finished hand as one binary record in append-only segment files:
+
+  segment = b"PKHH" + u32 version, then records
+  record  = u32 payload length, u32 crc32 of the payload, payload
+
+A HandRecorder on each PokerGame collects the hand as it is played (a tuple per action),
+encodes it once at showdown and queues the bytes for a HandHistoryWriter, whose own
+thread does the file writes.  HandHistoryReader memory-maps the segments and walks
+them record by record.
+
+  python handhistory.py hand_history          # print every hand
+  python handhistory.py hand_history --count  # just count them
+"""
+
+import argparse
+import glob
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+
+try:
+    # a real OS thread and queue even when eventlet has patched the stdlib
+    from eventlet.patcher import original
+    threading = original("threading")
+    queue = original("queue")
+except ImportError:
+    import queue
+    import threading
+
+MAGIC = b"PKHH"
+VERSION = 2
+SEGMENT_HEADER = struct.Struct("<4sI")
+RECORD_HEADER = struct.Struct("<II")  # payload length, crc32
+HAND_HEADERS = {
+    1: struct.Struct("<QdB"),  # hand number, unix time, seat count
+    2: struct.Struct("<QQdB"),  # hand number, deal seed, unix time, seat count
+}
+HAND_HEADER = HAND_HEADERS[VERSION]
+SEAT = struct.Struct("<BiBB")  # seat position, chips before the hand, hole cards
+ACTION = struct.Struct("<BBBi")  # seat index, street, action, chips put in
+PAYOUT = struct.Struct("<Bi")  # seat index, chips won
+COUNT8 = struct.Struct("<B")
+COUNT16 = struct.Struct("<H")
+
+SEGMENT_BYTES = 64 * 1024 * 1024
+NO_CARD = 255
+
+# leave: the player left mid-hand; what they put in stays in the pot
+ACTIONS = ("ante", "fold", "check", "call", "bet", "raise", "allin", "leave")
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+STREETS = ("preflop", "flop", "turn", "river")
+STREET_CODES = {street: code for code, street in enumerate(STREETS)}
+
+
+# -------------------- Encoding --------------------
+def _pack_string(parts, text):
+    data = text.encode()[:255]
+    parts.append(COUNT8.pack(len(data)))
+    parts.append(data)
+
+
+def _unpack_string(buffer, offset):
+    (length,) = COUNT8.unpack_from(buffer, offset)
+    offset += 1
+    return bytes(buffer[offset:offset + length]).decode(), offset + length
+
+
+# seats: [(seat_position, uuid, name, chips, cards)], actions: [(seat index, street, action, amount)]
+# payouts: [(seat index, amount)]
+def encode_hand(table_id, hand_number, seed, timestamp, seats, board, actions, payouts):
+    parts = []
+    _pack_string(parts, str(table_id))
+    parts.append(HAND_HEADER.pack(hand_number, seed, timestamp, len(seats)))
+    for seat_position, uuid, name, chips, cards in seats:
+        first = cards[0] if len(cards) > 0 else NO_CARD
+        second = cards[1] if len(cards) > 1 else NO_CARD
+        parts.append(SEAT.pack(seat_position, chips, first, second))
+        _pack_string(parts, uuid)
+        _pack_string(parts, name)
+    parts.append(COUNT8.pack(len(board)))
+    parts.append(bytes(board))
+    parts.append(COUNT16.pack(len(actions)))
+    parts.extend(ACTION.pack(*action) for action in actions)
+    parts.append(COUNT8.pack(len(payouts)))
+    parts.extend(PAYOUT.pack(*payout) for payout in payouts)
+    return b"".join(parts)
+
+
+# version is the segment's; version 1 records carry no deal seed
+def decode_hand(buffer, version=VERSION):
+    table_id, offset = _unpack_string(buffer, 0)
+    header = HAND_HEADERS[version]
+    if version == 1:
+        hand_number, timestamp, seat_count = header.unpack_from(buffer, offset)
+        seed = None
+    else:
+        hand_number, seed, timestamp, seat_count = header.unpack_from(buffer, offset)
+    offset += header.size
+    seats = []
+    for _ in range(seat_count):
+        seat_position, chips, first, second = SEAT.unpack_from(buffer, offset)
+        offset += SEAT.size
+        uuid, offset = _unpack_string(buffer, offset)
+        name, offset = _unpack_string(buffer, offset)
+        cards = [card for card in (first, second) if card != NO_CARD]
+        seats.append({"seat_position": seat_position, "uuid": uuid, "name": name, "chips": chips, "cards": cards})
+    (board_count,) = COUNT8.unpack_from(buffer, offset)
+    offset += 1
+    board = list(buffer[offset:offset + board_count])
+    offset += board_count
+    (action_count,) = COUNT16.unpack_from(buffer, offset)
+    offset += COUNT16.size
+    actions = []
+    for index, street, action, amount in ACTION.iter_unpack(buffer[offset:offset + action_count * ACTION.size]):
+        actions.append({"seat": index, "street": STREETS[street], "action": ACTIONS[action], "amount": amount})
+    offset += action_count * ACTION.size
+    (payout_count,) = COUNT8.unpack_from(buffer, offset)
+    offset += 1
+    payouts = {seats[index]["uuid"]: amount
+               for index, amount in PAYOUT.iter_unpack(buffer[offset:offset + payout_count * PAYOUT.size])}
+    return {"table_id": table_id, "hand": hand_number, "seed": seed, "time": timestamp, "seats": seats,
+            "board": board, "actions": actions, "payouts": payouts}
+
+
+# -------------------- Recording --------------------
+# Collects one table's hand while it is played; PokerGame calls it from start_round,
+# apply_action, on_disconnect and showdown
+class HandRecorder:
+    def __init__(self, writer, table_id):
+        self.writer = writer
+        self.table_id = table_id
+        self.hand_number = 0
+        self.seed = 0
+        self.seat_index = {}
+        self.seats = []
+        self.actions = []
+
+    def start_hand(self, game):
+        self.hand_number += 1
+        self.seed = game.hand_seed or 0
+        self.seat_index = {}
+        self.seats = []
+        self.actions = []
+        for index in game.turn_order:
+            player = game.seat_players[index]
+            uuid = player.uuid
+            ante = game.pot.contributions.get(uuid, 0)
+            self.seat_index[uuid] = len(self.seats)
+            self.seats.append((player.seat_position, uuid, player.name, player.chips + ante, tuple(player.hand)))
+            if ante:
+                self.actions.append((self.seat_index[uuid], 0, ACTION_CODES["ante"], ante))
+
+    def action(self, uuid, street, action, amount):
+        index = self.seat_index.get(uuid)
+        if index is not None:
+            self.actions.append((index, STREET_CODES.get(street, 0), ACTION_CODES.get(action, 0), amount))
+
+    # the player reconnected under a new id; the record keeps the id they were dealt in with
+    def rekey(self, old_uuid, new_uuid):
+        if old_uuid in self.seat_index:
+            self.seat_index[new_uuid] = self.seat_index.pop(old_uuid)
+
+    def finish_hand(self, game, payouts):
+        if not self.seats:
+            return
+        record = encode_hand(self.table_id, self.hand_number, self.seed, time.time(), self.seats, game.community_cards,
+                             self.actions, [(self.seat_index[uuid], amount) for uuid, amount in payouts.items()
+                                            if uuid in self.seat_index])
+        self.seats = []
+        self.writer.append(record)
+
+
+# -------------------- Writing --------------------
+# Appends records to segment files from a background thread.  append() only puts the
+# bytes on a queue; the thread writes everything waiting in one go and flushes.
+# Segments are named hands-<worker id>-<number>.seg, so the workers of a cluster can
+# share one directory without ever writing to the same file.
+class HandHistoryWriter:
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, worker_id="local"):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.prefix = f"hands-{worker_id}-"
+        os.makedirs(directory, exist_ok=True)
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, name="hand-history", daemon=True)
+        self.thread.start()
+
+    def append(self, payload):
+        self.queue.put(payload)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _open_segment(self):
+        if self.file is not None:
+            self.file.close()
+        numbers = [name[len(self.prefix):-4] for name in os.listdir(self.directory)
+                   if name.startswith(self.prefix) and name.endswith(".seg")]
+        number = max((int(n) for n in numbers if n.isdigit()), default=0) + 1
+        while True:
+            try:
+                # exclusive create: a segment only ever has the one writer that made it
+                self.file = open(os.path.join(self.directory, f"{self.prefix}{number:06d}.seg"), "xb")
+                break
+            except FileExistsError:
+                number += 1
+        self.file.write(SEGMENT_HEADER.pack(MAGIC, VERSION))
+        self.written = SEGMENT_HEADER.size
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for payload in batch:
+                if payload is None:
+                    if self.file is not None:
+                        self.file.close()
+                    return
+                if self.file is None or self.written >= self.segment_bytes:
+                    self._open_segment()
+                self.file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+                self.file.write(payload)
+                self.written += RECORD_HEADER.size + len(payload)
+            self.file.flush()
+
+
+# -------------------- Reading --------------------
+# Walks every record of one segment file or a directory of them, in order.  Files are
+# memory-mapped, so only the pages being read are loaded.  A torn record at the end of
+# a segment (the server stopped mid-write) ends that segment.
+class HandHistoryReader:
+    def __init__(self, path, verify=True):
+        if os.path.isdir(path):
+            self.paths = sorted(glob.glob(os.path.join(path, "hands-*.seg")))
+        else:
+            self.paths = [path]
+        self.verify = verify
+
+    # (segment version, payload bytes) for every record
+    def records(self):
+        for path in self.paths:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < SEGMENT_HEADER.size:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield from self._segment_records(mapped, path)
+
+    def _segment_records(self, mapped, path):
+        magic, version = SEGMENT_HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version not in HAND_HEADERS:
+            raise ValueError(f"{path} is not a hand history segment this reader knows")
+        offset = SEGMENT_HEADER.size
+        end = len(mapped)
+        while offset + RECORD_HEADER.size <= end:
+            length, crc = RECORD_HEADER.unpack_from(mapped, offset)
+            start = offset + RECORD_HEADER.size
+            if start + length > end:
+                break
+            # slicing the map copies just this record
+            payload = mapped[start:start + length]
+            if self.verify and zlib.crc32(payload) != crc:
+                raise ValueError(f"{path}: corrupt record at byte {offset}")
+            yield version, payload
+            offset = start + length
+
+    def __iter__(self):
+        for version, payload in self.records():
+            yield decode_hand(payload, version)
+
+    def count(self):
+        return sum(1 for _ in self.records())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read hand history segments")
+    parser.add_argument("path", help="a segment file or a directory of them")
+    parser.add_argument("--count", action="store_true", help="only count the hands")
+    args = parser.parse_args()
+
+    reader = HandHistoryReader(args.path)
+    if args.count:
+        print(reader.count())
+        return
+    import deck
+    for hand in reader:
+        seats = ", ".join(f"{s['name']} {' '.join(deck.card_names(s['cards']))}" for s in hand["seats"])
+        print(f"table {hand['table_id']} hand {hand['hand']}: {seats} | board "
+              f"{' '.join(deck.card_names(hand['board']))} | {len(hand['actions'])} actions | "
+              f"payouts {hand['payouts']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
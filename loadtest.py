@@ -0,0 +1,267 @@
+"""
+CS 3050 Poker Game - loadtest.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Load generator: headless python-socketio bots sit down at tables, ready up, start the
+game and play whatever available_actions offers until the time is up.
+
+  python loadtest.py --clients 1000 --per-table 6 --duration 60
+  python loadtest.py --url http://10.0.0.5:5000 --clients 2000 --json-out results.json
+
+Without --url a server is started from app.py on --port and its CPU use is reported.
+Latency is measured from sending player_action to receiving the next game state.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import eventlet
+
+
+# -------------------- Stats --------------------
+def percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(fraction * len(values)))
+    return values[index]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []  # seconds from player_action to the next game state
+        self.messages = 0
+        self.actions = 0
+        self.errors = 0
+        self.connected = 0
+
+    def report(self, elapsed, cpu_seconds=None):
+        latencies = sorted(self.latencies)
+        in_ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "clients": self.connected,
+            "seconds": round(elapsed, 2),
+            "actions": self.actions,
+            "messages": self.messages,
+            "messages_per_sec": round(self.messages / elapsed, 1) if elapsed else 0.0,
+            "actions_per_sec": round(self.actions / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": in_ms(percentile(latencies, 0.50)),
+                "p99": in_ms(percentile(latencies, 0.99)),
+                "p999": in_ms(percentile(latencies, 0.999)),
+                "max": in_ms(latencies[-1] if latencies else None),
+            },
+            "errors": self.errors,
+            "server_cpu_percent": round(100 * cpu_seconds / elapsed, 1) if cpu_seconds is not None and elapsed else None,
+        }
+
+
+# -------------------- Server CPU --------------------
+# user + system CPU seconds used so far by a local process and its children (app.py runs
+# under the debug reloader, so the server itself is a child), None if it can't be read
+def cpu_seconds(pid):
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        process = psutil.Process(pid)
+        return sum(sum(p.cpu_times()[:2]) for p in [process] + process.children(recursive=True))
+
+    stats = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else ():
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # fields[1] is the parent pid, fields[11] / [12] user / system clock ticks
+        stats[int(entry)] = (int(fields[1]), int(fields[11]) + int(fields[12]))
+    if pid not in stats:
+        return None
+    tree = {pid}
+    added = True
+    while added:
+        children = {child for child, (parent, _) in stats.items() if parent in tree} - tree
+        tree |= children
+        added = bool(children)
+    return sum(stats[member][1] for member in tree) / os.sysconf("SC_CLK_TCK")
+
+
+# -------------------- Bots --------------------
+class Bot:
+    def __init__(self, url, table_id, stats, rng, strategy="random", encoding="json", think=0.0):
+        import socketio
+        import wire
+        self.wire = wire
+        self.url = url
+        self.table_id = table_id
+        self.stats = stats
+        self.rng = rng
+        self.strategy = strategy
+        self.encoding = encoding
+        self.think = think
+        self.sent_at = None
+        self.to_act = None
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on("*", self.on_event)
+
+    def connect(self):
+        self.sio.connect(self.url, transports=["websocket"])
+        self.sio.emit("set_name", {"table_id": self.table_id, "encodings": [self.encoding]})
+        self.stats.connected += 1
+
+    def on_event(self, event, data=None):
+        self.stats.messages += 1
+        if event == "frame":
+            for name, payload in self.wire.decode_frame(data):
+                self.handle(name, payload)
+        else:
+            self.handle(event, data)
+        # act only once the whole frame is read, so its own state doesn't count as the reply
+        if self.to_act:
+            actions, self.to_act = self.to_act, None
+            self.act(actions)
+
+    def handle(self, event, data):
+        if event in ("game_state", "game_state_delta"):
+            if self.sent_at is not None:
+                self.stats.latencies.append(time.perf_counter() - self.sent_at)
+                self.sent_at = None
+        elif event == "available_actions":
+            self.to_act = data.get("actions")
+        elif event == "error_message":
+            self.stats.errors += 1
+
+    def act(self, actions):
+        if self.think:
+            eventlet.sleep(self.rng.uniform(0, self.think))
+        if self.strategy == "passive":
+            action = next((a for a in ("check", "call") if a in actions), "fold")
+        else:
+            action = self.rng.choice(actions)
+        amount = self.rng.choice([10, 20, 50, 100])
+        if not self.sio.connected:
+            return
+        self.sent_at = time.perf_counter()
+        self.stats.actions += 1
+        self.sio.emit("player_action", {"action": action, "amount": amount})
+
+    def disconnect(self):
+        try:
+            self.sio.disconnect()
+        except Exception:
+            pass
+
+
+def start_server(port):
+    env = dict(os.environ, PORT=str(port), EQUITY_WORKERS=os.environ.get("EQUITY_WORKERS", "1"))
+    return subprocess.Popen([sys.executable, "app.py"], env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_for_server(url, timeout=15.0):
+    import socket
+    from urllib.parse import urlparse
+    address = urlparse(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((address.hostname, address.port or 80), timeout=1).close()
+            return True
+        except OSError:
+            eventlet.sleep(0.2)
+    return False
+
+
+def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        server = start_server(args.port)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        if not wait_for_server(url):
+            sys.exit(f"Server at {url} did not come up")
+
+        stats = Stats()
+        rng = random.Random(args.seed)
+        bots = []
+        pool = eventlet.GreenPool(args.connect_concurrency)
+        for index in range(args.clients):
+            table_id = f"load-{index // args.per_table}"
+            bots.append(Bot(url, table_id, stats, random.Random(rng.random()),
+                            args.strategy, args.encoding, args.think))
+
+        def connect(bot):
+            try:
+                bot.connect()
+            except Exception:
+                stats.errors += 1
+        list(pool.imap(connect, bots))
+        print(f"Connected {stats.connected}/{args.clients} clients")
+
+        for bot in bots:
+            if bot.sio.connected:
+                bot.sio.emit("ready", {"ready": True})
+        eventlet.sleep(1.0)
+
+        cpu_before = cpu_seconds(server.pid) if server else None
+        started = time.perf_counter()
+        # the first bot at each table deals; the server deals every hand after that
+        for bot in bots[::args.per_table]:
+            if bot.sio.connected:
+                bot.sio.emit("start_game", {})
+        eventlet.sleep(args.duration)
+        elapsed = time.perf_counter() - started
+        cpu_after = cpu_seconds(server.pid) if server else None
+
+        for bot in bots:
+            bot.disconnect()
+        used = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+        return stats.report(elapsed, used)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many headless clients against the poker server")
+    parser.add_argument("--url", help="server to test (default: start app.py locally)")
+    parser.add_argument("--port", type=int, default=5077, help="port for the local server")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--per-table", type=int, default=6)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of play to measure")
+    parser.add_argument("--strategy", choices=["random", "passive"], default="random")
+    parser.add_argument("--encoding", choices=["json", "msgpack"], default="json")
+    parser.add_argument("--think", type=float, default=0.0, help="max random delay before each action")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", help="also write the results here, for comparing releases")
+    args = parser.parse_args()
+
+    # bots are green threads; patch before socketio / requests / websocket-client load
+    eventlet.monkey_patch()
+    result = run(args)
+
+    latency = result["latency_ms"]
+    print(f"{result['clients']} clients, {result['actions']} actions in {result['seconds']}s")
+    print(f"latency ms  p50 {latency['p50']}  p99 {latency['p99']}  p999 {latency['p999']}  max {latency['max']}")
+    print(f"messages/sec {result['messages_per_sec']}  actions/sec {result['actions_per_sec']}  errors {result['errors']}")
+    if result["server_cpu_percent"] is not None:
+        print(f"server CPU {result['server_cpu_percent']}%")
+    if args.json_out:
+        with open(args.json_out, "w") as out:
+            json.dump(result, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
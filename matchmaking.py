@@ -0,0 +1,86 @@
+"""
+CS 3050 Poker Game - matchmaking.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Picks the table a player sits at when they don't ask for one.  Tables are pooled by
+stake (the ante) and size; each pool keeps a heap of its tables with a free seat, the
+fullest first, so partially occupied tables fill before anyone is put at an empty one
+and a new table is only opened when every table in the pool is full.
+
+The heap entries are never updated in place: every time a table's occupancy changes a
+new entry is pushed, and entries that no longer match the table are dropped when they
+reach the top.  Seating a player is O(log n) in the number of open tables; the heap is
+rebuilt once stale entries outnumber the live ones.
+"""
+
+import heapq
+import itertools
+
+STAKES = (5, 10, 25, 50)  # antes a table can play for
+TABLE_SIZES = (2, 6, 8)  # the client draws 8 seats, smaller tables use the first ones
+DEFAULT_STAKE = 10
+DEFAULT_SIZE = 8
+
+
+def valid_pool(stake, size):
+    return stake in STAKES and size in TABLE_SIZES
+
+
+class Pool:
+    def __init__(self):
+        self.heap = []  # (-players seated, table order, table id)
+        self.open = {}  # table id -> Table, every table in the pool with a free seat
+
+
+class Matchmaker:
+    def __init__(self):
+        self.pools = {}  # (stake, size) -> Pool
+        self.order = {}  # table id -> when the table joined its pool, older tables first on ties
+        self._counter = itertools.count()
+
+    def _pool(self, table):
+        key = (table.stake, table.seat_count)
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = Pool()
+        return pool
+
+    # The fullest table of the pool with a free seat, None if they are all full
+    def best_table(self, stake, size):
+        pool = self.pools.get((stake, size))
+        if pool is None:
+            return None
+        heap = pool.heap
+        while heap:
+            negative_seated, _, table_id = heap[0]
+            table = pool.open.get(table_id)
+            if table is not None and -negative_seated == len(table.seat_of):
+                return table
+            # stale: the table filled up, closed, or its occupancy changed since
+            heapq.heappop(heap)
+        return None
+
+    # Called whenever a table gains or loses a player, opens or closes
+    def update(self, table, closed=False):
+        pool = self._pool(table)
+        table_id = table.table_id
+        if closed or table.is_full():
+            pool.open.pop(table_id, None)
+            if closed:
+                self.order.pop(table_id, None)
+            return
+        if table_id not in self.order:
+            self.order[table_id] = next(self._counter)
+        pool.open[table_id] = table
+        heapq.heappush(pool.heap, (-len(table.seat_of), self.order[table_id], table_id))
+        if len(pool.heap) > 2 * len(pool.open) + 64:
+            self._compact(pool)
+
+    def _compact(self, pool):
+        pool.heap = [(-len(table.seat_of), self.order[table_id], table_id) for table_id, table in pool.open.items()]
+        heapq.heapify(pool.heap)
+
+    # {(stake, size): (open tables, players seated at them)} for monitoring
+    def summary(self):
+        return {key: (len(pool.open), sum(len(table.seat_of) for table in pool.open.values()))
+                for key, pool in self.pools.items()}
@@ -0,0 +1,209 @@
+"""
+CS 3050 Poker Game - metrics.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Counters, gauges and histograms rendered in the Prometheus text format for /metrics.
+Everything is recorded from the event loop's one OS thread (green threads only switch
+at I/O), so recording is a dict update and a list increment with no locks.  Gauges that
+describe the server (tables, players) are computed when /metrics is scraped instead of
+being kept up to date on every change.
+"""
+
+import bisect
+import functools
+import time
+
+from socketio import packet
+
+# seconds, for handler latency
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# -------------------- Metric Types --------------------
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # label values tuple -> count
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        if not self.labels and not self.values:
+            yield self.name, "", 0
+        for label_values, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+# Value read from the rest of the server at scrape time; read() returns a number, or a
+# {label values: number} dict when the gauge has labels
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.labels = tuple(labels)
+
+    def samples(self):
+        value = self.read()
+        if not self.labels:
+            yield self.name, "", value
+            return
+        for label_values, item in sorted(value.items()):
+            yield self.name, _format_labels(self.labels, label_values), item
+
+
+# A counter whose total lives elsewhere (a module global, another object)
+class CounterFunction(Gauge):
+    kind = "counter"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values tuple -> [per bucket counts (last is +Inf), sum]
+
+    def observe(self, value, label_values=()):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        # le is inclusive, so a value equal to a bound lands in that bucket
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        bounds = self.buckets + (float("inf"),)
+        for label_values, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = _format_labels(self.labels + ("le",), label_values + (_format_value(bound),))
+                yield f"{self.name}_bucket", labels, cumulative
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+# Events in the last `seconds`, counted in one slot per second so recording never
+# allocates and old slots are simply overwritten
+class RateWindow:
+    def __init__(self, seconds=60, clock=time.monotonic):
+        self.seconds = seconds
+        self.clock = clock
+        self.counts = [0] * seconds
+        self.stamps = [0] * seconds
+
+    def add(self, amount=1):
+        second = int(self.clock())
+        slot = second % self.seconds
+        if self.stamps[slot] != second:
+            self.stamps[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += amount
+
+    def total(self):
+        now = int(self.clock())
+        return sum(count for count, stamp in zip(self.counts, self.stamps) if now - stamp < self.seconds)
+
+
+# -------------------- Registry --------------------
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.add(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name, help_text, read, labels=()):
+        return self.add(Gauge(name, help_text, read, labels))
+
+    def counter_function(self, name, help_text, read, labels=()):
+        return self.add(CounterFunction(name, help_text, read, labels))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# -------------------- Socket.IO --------------------
+# Wraps a Socket.IO handler so its run time is observed under the event's name
+def timed(histogram, event):
+    label_values = (event,)
+
+    def decorate(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, label_values)
+        return wrapper
+    return decorate
+
+
+# Counts every event packet the server encodes, and its size, by event name.  A room
+# broadcast is encoded once for all its members, so it counts once.  meter(event, size)
+# hears of every packet too, except the frame_event ones: the events inside a frame are
+# metered one by one as it is flushed (see frames.Frame.flush).
+def metered_packet_class(base, packets, packet_bytes, meter=None, frame_event="frame"):
+    class MeteredPacket(base):
+        def encode(self):
+            encoded = super().encode()
+            if self.packet_type in (packet.EVENT, packet.BINARY_EVENT) and self.data:
+                event = str(self.data[0])
+                if isinstance(encoded, list):
+                    # binary events: the JSON part, then one attachment per binary argument
+                    size = sum(len(part) for part in encoded)
+                else:
+                    # text packets count characters, which is their size for ASCII payloads
+                    size = len(encoded)
+                packets.inc((event,))
+                packet_bytes.inc((event,), size)
+                if meter is not None and event != frame_event:
+                    meter(event, size)
+            return encoded
+    return MeteredPacket
@@ -0,0 +1,161 @@
+"""
+CS 3050 Poker Game - profiler.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Sampling profiler for the running server.  A real OS thread wakes every few
+milliseconds and reads the event loop thread's current stack with
+sys._current_frames(); nothing runs inside the loop itself, so the server pays for
+one stack walk per sample (well under 1% at the default rate) instead of the 2x of a
+tracing profiler.
+
+All greenlets share the loop thread, so the stack seen is whichever greenlet is
+running.  Samples are grouped by the Socket.IO handler on the stack (handlers are
+registered with label()), otherwise by the greenlet's entry function, and "idle" when
+only the eventlet hub is running.  Results come out as collapsed stacks (one
+"group;frame;frame count" line per stack, for flamegraph.pl / speedscope) or as a
+speedscope file with one profile per group.
+"""
+
+import os
+import sys
+import time
+
+try:
+    # a real OS thread and sleep even when eventlet has patched the stdlib
+    from eventlet.patcher import original
+    threading = original("threading")
+    _sleep = original("time").sleep
+except ImportError:
+    import threading
+    _sleep = time.sleep
+
+INTERVAL = 0.005  # seconds between samples
+MAX_SECONDS = 120.0
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+_EVENTLET = os.sep + "eventlet" + os.sep
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+class Profiler:
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.handlers = {}  # code object -> Socket.IO event
+        self.counts = {}  # (group, stack of (function, file, line)) -> samples
+        self.thread = None
+        self.running = False
+        self.started = None
+        self.elapsed = 0.0
+        self.samples = 0
+
+    # Samples with this function on the stack are grouped under the event
+    def label(self, handler, event):
+        self.handlers[handler.__code__] = event
+
+    # -------------------- Control --------------------
+    # Starts sampling the calling thread (the event loop); raises ProfilerBusy if a
+    # profile is already being taken
+    def start(self):
+        if self.running:
+            raise ProfilerBusy("a profile is already running")
+        self.counts = {}
+        self.samples = 0
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, args=(threading.get_ident(),),
+                                       name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.elapsed = time.perf_counter() - self.started
+        return self.counts
+
+    # Profiles for `seconds`; sleep is the event loop's (socketio.sleep) so the server
+    # keeps running while the samples are taken
+    def profile(self, seconds, sleep):
+        self.start()
+        try:
+            sleep(min(seconds, MAX_SECONDS))
+        finally:
+            self.stop()
+        return self.counts
+
+    def sample_seconds(self):
+        return self.elapsed / self.samples if self.samples else self.interval
+
+    # -------------------- Sampling thread --------------------
+    def _run(self, target):
+        counts = self.counts
+        while self.running:
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                key = self._sample(frame)
+                counts[key] = counts.get(key, 0) + 1
+                self.samples += 1
+            del frame
+            _sleep(self.interval)
+
+    def _sample(self, frame):
+        stack = []
+        event = None
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            if code in self.handlers:
+                # the outermost handler wins, a handler calling another is still the first
+                event = self.handlers[code]
+            frame = frame.f_back
+        stack.reverse()
+        if event is not None:
+            return f"event:{event}", tuple(stack)
+        for name, filename, _ in stack:
+            if _EVENTLET not in filename:
+                return f"greenlet:{name}", tuple(stack)
+        return "idle", tuple(stack)
+
+
+# -------------------- Output --------------------
+def _frame_name(frame):
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed(counts):
+    lines = []
+    for (group, stack), count in sorted(counts.items(), key=lambda item: -item[1]):
+        names = [group] + [_frame_name(frame).replace(";", ":") for frame in stack]
+        lines.append(f"{';'.join(names)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+# One sampled profile per group, heaviest group first.  sample_seconds is the time one
+# sample stands for (Profiler.sample_seconds(): the GIL can stretch the interval).
+def speedscope(counts, sample_seconds=INTERVAL, name="poker server"):
+    frames = []
+    frame_index = {}
+    groups = {}
+    for (group, stack), count in counts.items():
+        indexes = []
+        for frame in stack:
+            if frame not in frame_index:
+                frame_index[frame] = len(frames)
+                function, filename, line = frame
+                frames.append({"name": function, "file": filename, "line": line})
+            indexes.append(frame_index[frame])
+        samples, weights = groups.setdefault(group, ([], []))
+        samples.append(indexes)
+        weights.append(count * sample_seconds)
+
+    profiles = []
+    for group, (samples, weights) in sorted(groups.items(), key=lambda item: -sum(item[1][1])):
+        profiles.append({"type": "sampled", "name": group, "unit": "seconds", "startValue": 0,
+                         "endValue": sum(weights), "samples": samples, "weights": weights})
+    return {"$schema": SPEEDSCOPE_SCHEMA, "name": name, "exporter": "poker profiler",
+            "shared": {"frames": frames}, "profiles": profiles}
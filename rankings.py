@@ -5,220 +5,224 @@ hand_ranking_weight_to_string = {1: "High Card", 2: "One Pair", 3: "Two Pair", 4
                                  6: "Flush", 7: "Full House", 8: "Four of a Kind", 9: "Straight Flush",
                                  10: "Royal Flush"}
 
+# -------------------- Card Encoding --------------------
+# Cards are evaluated as integers 0-51: code = (rank - 2) * 4 + suit index
+# so code >> 2 is the rank's bit (2 -> bit 0, Ace -> bit 12) and code & 3 is the suit.
+# Ranks are 2-14 here (Ace is always 14; the wheel is handled by the straight table).
+SUITS = ("Hearts", "Diamonds", "Clubs", "Spades")
+SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
+
+
+# Card.number counts the Ace as 1, the evaluator counts it as 14
+def encode_card(suit, card_number):
+    rank = 14 if card_number == 1 else card_number
+    return (rank - 2) * 4 + SUIT_INDEX[suit]
+
+
+# -------------------- Hand Strength --------------------
+# A hand strength is one integer: category << 20 followed by up to five 4-bit rank
+# values (most significant first), so comparing two strengths compares the hands,
+# kickers included.  Royal Flush is the Ace high Straight Flush.
+HIGH_CARD = 1
+ONE_PAIR = 2
+TWO_PAIR = 3
+THREE_OF_A_KIND = 4
+STRAIGHT = 5
+FLUSH = 6
+FULL_HOUSE = 7
+FOUR_OF_A_KIND = 8
+STRAIGHT_FLUSH = 9
+ROYAL_FLUSH = 10
+
+CATEGORY_SHIFT = 20
+
+
+def _build_tables():
+    # Every lookup is indexed by a 13 bit rank mask (bit 0 = 2 ... bit 12 = Ace)
+    straight_windows = [(0x1F << (high - 6), high) for high in range(14, 5, -1)]
+    straight_windows.append((0x100F, 5))  # A2345
+
+    popcount = [0] * 8192
+    top_rank = [0] * 8192
+    top_five = [0] * 8192
+    straight = [0] * 8192
+    for mask in range(1, 8192):
+        ranks = [bit + 2 for bit in range(12, -1, -1) if mask >> bit & 1]
+        popcount[mask] = len(ranks)
+        top_rank[mask] = ranks[0]
+        packed = 0
+        for position, rank in enumerate(ranks[:5]):
+            packed |= rank << (16 - 4 * position)
+        top_five[mask] = packed
+        for window, high in straight_windows:
+            if mask & window == window:
+                straight[mask] = high
+                break
+    return popcount, top_rank, top_five, straight
+
+
+POPCOUNT, TOP_RANK, TOP_FIVE, STRAIGHT_HIGH = _build_tables()
+
+
+# Returns the strength of a hand given the rank mask held in each of the four suits.
+# Valid for up to seven cards (a flush then rules out quads and full houses).
+def evaluate_masks(hearts, diamonds, clubs, spades):
+    for suit_mask in (hearts, diamonds, clubs, spades):
+        if POPCOUNT[suit_mask] >= 5:
+            high = STRAIGHT_HIGH[suit_mask]
+            if high:
+                return STRAIGHT_FLUSH << CATEGORY_SHIFT | high << 16
+            return FLUSH << CATEGORY_SHIFT | TOP_FIVE[suit_mask]
+
+    ranks = hearts | diamonds | clubs | spades
+
+    quads = hearts & diamonds & clubs & spades
+    if quads:
+        quad_rank = TOP_RANK[quads]
+        kicker = TOP_RANK[ranks ^ (1 << quad_rank - 2)]
+        return FOUR_OF_A_KIND << CATEGORY_SHIFT | quad_rank << 16 | kicker << 12
+
+    # ranks held in at least two / at least three suits
+    pairs = (hearts & diamonds) | (clubs & spades) | ((hearts | diamonds) & (clubs | spades))
+    trips = (hearts & diamonds & (clubs | spades)) | (clubs & spades & (hearts | diamonds))
+
+    if trips:
+        trips_rank = TOP_RANK[trips]
+        other_pairs = pairs ^ (1 << trips_rank - 2)  # a second three of a kind counts as the pair
+        if other_pairs:
+            return FULL_HOUSE << CATEGORY_SHIFT | trips_rank << 16 | TOP_RANK[other_pairs] << 12
+
+    high = STRAIGHT_HIGH[ranks]
+    if high:
+        return STRAIGHT << CATEGORY_SHIFT | high << 16
+
+    if trips:
+        kickers = TOP_FIVE[ranks ^ (1 << trips_rank - 2)] >> 4 & 0xFF00
+        return THREE_OF_A_KIND << CATEGORY_SHIFT | trips_rank << 16 | kickers
+
+    if pairs:
+        high_pair = TOP_RANK[pairs]
+        pairs ^= 1 << high_pair - 2
+        if pairs:
+            low_pair = TOP_RANK[pairs]
+            kicker = TOP_RANK[ranks ^ (1 << high_pair - 2) ^ (1 << low_pair - 2)]
+            return TWO_PAIR << CATEGORY_SHIFT | high_pair << 16 | low_pair << 12 | kicker << 8
+        kickers = TOP_FIVE[ranks ^ (1 << high_pair - 2)] >> 4 & 0xFFF0
+        return ONE_PAIR << CATEGORY_SHIFT | high_pair << 16 | kickers
+
+    return HIGH_CARD << CATEGORY_SHIFT | TOP_FIVE[ranks]
+
+
+# Hands scored in this process (evaluate_card_mask calls and batch rows), for /metrics
+evaluations = 0
+
+# One bit per card laid out as four 13 bit suit masks (Hearts lowest), so the cards of a
+# hand can be summed into a single card mask
+CARD_BITS = tuple(1 << (13 * (code & 3) + (code >> 2)) for code in range(52))
+_card_bit = CARD_BITS.__getitem__
+
+
+def card_mask(codes):
+    return sum(map(_card_bit, codes))
+
+
+def evaluate_card_mask(card_mask):
+    global evaluations
+    evaluations += 1
+    return evaluate_masks(card_mask & 0x1FFF, card_mask >> 13 & 0x1FFF, card_mask >> 26 & 0x1FFF, card_mask >> 39)
+
+
+# Returns the strength of a list of encoded cards (see encode_card)
+def evaluate(codes):
+    return evaluate_card_mask(card_mask(codes))
+
+
+# Converts a strength into the (category, high card) view used by the rest of the game
+# AAAKK -> (7, (14, 13)), 5522883 -> (3, (8, 5)), 10JQKA suited -> (10, 0)
+def strength_to_rank(strength):
+    category = strength >> CATEGORY_SHIFT
+    first = strength >> 16 & 0xF
+    if category == STRAIGHT_FLUSH and first == 14:
+        return ROYAL_FLUSH, 0  # only one way for a royal flush, high card doesn't matter
+    if category == TWO_PAIR or category == FULL_HOUSE:
+        return category, (first, strength >> 12 & 0xF)
+    return category, first
 
-# Note: Ace card_number is 14 if it is used as a high card
 
 # Returns the hand ranking along with the high card of that ranking
 def rank_hand(full_hand):
-    if has_royal_flush(full_hand):
-        return 10, 0  # only one way for a straight flush, high card doesn't matter
-    straight_flush_bool, straight_flush_high_card = has_straight_flush(full_hand)
-    if straight_flush_bool:
-        return 9, straight_flush_high_card
-    four_of_a_kind_bool, four_of_a_kind_high_card = has_four_of_a_kind(full_hand)
-    if four_of_a_kind_bool:
-        return 8, four_of_a_kind_high_card
-    full_house_bool, full_house_cards = has_full_house(full_hand)
-    if full_house_bool:
-        return 7, full_house_cards
-    flush_bool, flush_high_card = has_flush(full_hand)
-    if flush_bool:
-        return 6, flush_high_card
-    straight_bool, straight_high_card = has_straight(full_hand)
-    if straight_bool:
-        return 5, straight_high_card
-    three_of_a_kind_bool, three_of_a_kind_card = has_three_of_a_kind(full_hand)
-    if three_of_a_kind_bool:
-        return 4, three_of_a_kind_card
-    two_pair_bool, two_pair_cards = has_two_pair(full_hand)
-    if two_pair_bool:
-        return 3, two_pair_cards
-    one_pair_bool, one_pair_card = has_one_pair(full_hand)
-    if one_pair_bool:
-        return 2, one_pair_card
-    return 1, high_card(full_hand)
-
-
-# Returns whether there is a royal flush (there is no way to rank a royal flush further, so only return bool)
-def has_royal_flush(full_hand):
-    # a royal flush requires 5 cards minimum
-    if len(full_hand) < 5:
-        return False
-
-    straight_flush_check = has_straight_flush(full_hand)
-
-    # if there is a straight flush with Ace high, that's a royal flush
-    if straight_flush_check[0] and straight_flush_check[1] == 14:
-        return True
-
-    # otherwise no royal flush
-    return False
-
-
-# Returns whether there is a straight flush and the highest card of that straight flush
-def has_straight_flush(full_hand):
-    # a straight flush requires 5 cards minimum
-    if len(full_hand) < 5:
-        return False, 0
-    suit_groups = {"Hearts": [], "Diamonds": [], "Spades": [], "Clubs": []}
-    # group cards by suit
-    for card in full_hand:
-        suit_groups[card.suit].append(card)
-
-    # if there is a suit with a straight there is a straight flush
-    for suit in suit_groups:
-        straight_bool, straight_high_card = has_straight(suit_groups[suit])
-        if straight_bool:
-            return True, straight_high_card
-
-    # otherwise, no straight flush
-    return False, 0
-
-
-# return whether there's a four of a kind and what the card_number is
-# AAAA -> True, 14
-def has_four_of_a_kind(full_hand):
-    # a 4 of a kind requires 4 cards minimum (duh)
-    if len(full_hand) < 4:
-        return False, 0
-    full_hand_numbers = [card.number for card in full_hand]
-    for card_number in full_hand_numbers:
-        if full_hand_numbers.count(card_number) == 4:
-            if card_number == 1:
-                card_number = 14
-            return True, card_number
-    return False, 0
-
-
-# returns whether there's a full house and what the 3 of a kind is and the pair is in that order
-# AAAKK -> True, (A,K)
-def has_full_house(full_hand):
-    # a full_house requires 5 cards minimum
-    if len(full_hand) < 5:
-        return False, (0, 0)
-    three_of_a_kind = has_three_of_a_kind(full_hand)
-    two_pair = has_two_pair(full_hand)
-    # check equality because the high pair in the two pair could be within the 3 of a kind
-    if three_of_a_kind[0] and two_pair[0] and (three_of_a_kind[1] != max(two_pair[1])):
-        return True, (three_of_a_kind[1], max(two_pair[1]))
-    if three_of_a_kind[0] and two_pair[0] and (three_of_a_kind[1] != min(two_pair[1])):
-        return True, (three_of_a_kind[1], min(two_pair[1]))
-    return False, (0, 0)
-
-
-# returns whether there's a flush and what the high card of the flush is
-# 2H 5H 6H 10H 7H -> True, 10
-def has_flush(full_hand):
-    # a flush requires 5 cards minimum
-    if len(full_hand) < 5:
-        return False, 0
-    suit_groups = {"Hearts": [], "Diamonds": [], "Spades": [], "Clubs": []}
-    # group cards by suit
-    for card in full_hand:
-        suit_groups[card.suit].append(card)
-    for suit, cards in suit_groups.items():
-        if len(cards) > 4:  # there's a flush
-            return True, max([card.number for card in cards])
-    return False, 0
-
-
-# return whether there's a straight and what the highest card of the straight is.
-# A2345 -> True, 5
-# 10JQKA -> True, A
-def has_straight(full_hand):
-    # a straight requires 5 cards minimum
-    if len(full_hand) < 5:
-        return False, 0
-    has_straight_bool = False
-    current_high_card_number = 0
-    for card in full_hand:
-        high_card = check_straight_offsets(card.number, full_hand)
-        if high_card > current_high_card_number:
-            has_straight_bool = True
-            current_high_card_number = high_card
-    return has_straight_bool, current_high_card_number
-
-
-# checks the offsets about a card to see if there is 5 in a row
-def check_straight_offsets(card_number, full_hand):
-    if card_number > 10:
-        return 0
-    capture = 0
-    for i in range(1, 5):
-        # special case for Ace high
-        if card_number + i == 14:
-            if not value_in_full_hand(1, full_hand):
-                return 0
-            return 14
-
-        if not value_in_full_hand(card_number + i, full_hand):
-            return 0
-        capture = i
-    return card_number + capture
-
-
-# returns whether a value is within the full hand of cards
-def value_in_full_hand(card_number, full_hand):
-    for card in full_hand:
-        if card.number == card_number:
-            return True
-    return False
-
-
-# returns whether there's a three of a kind and the best three of a kind card
-# 3335557 -> True, 5
-def has_three_of_a_kind(full_hand):
-    # a three of a kind requires 3 cards minimum (duh)
-    if len(full_hand) < 3:
-        return False, 0
-
-    full_hand_numbers = [card.number for card in full_hand]
-    current_best = 0
-    for card_number in full_hand_numbers:
-        if card_number > current_best or card_number == 1:
-            if full_hand_numbers.count(card_number) == 3:
-                current_best = card_number
-                if current_best == 1:
-                    return True, 14
-
-    return current_best > 0, current_best
-
-
-# returns whether there's a two pair and the best two pair
-# 5522883 -> True, [5,8]
-def has_two_pair(full_hand):
-    # a 2 pair requires 4 cards minimum
-    if len(full_hand) < 4:
-        return False, 0
-    full_hand_numbers = [card.number for card in full_hand]
-    pairs = []
-    for card_number in full_hand_numbers:
-        if full_hand_numbers.count(card_number) >= 2:
-            if card_number == 1:
-                card_number = 14
-            if card_number not in pairs:
-                pairs.append(card_number)
-    if len(pairs) > 2:
-        pairs.remove(min(pairs))
-    return len(pairs) == 2, tuple(sorted(pairs, reverse=True))   # the higher card at index 0
-
-
-# returns whether there's a one pair and what the card number is
-# 44786 -> True, 4
-def has_one_pair(full_hand):
-    full_hand_numbers = [card.number for card in full_hand]
-    for card_number in full_hand_numbers:
-        if full_hand_numbers.count(card_number) == 2:
-            if card_number == 1:
-                return True, 14
-            return True, card_number
-    return False, 0
-
-
-# returns true (because there's always a high card if nothing else) and the card number
-# 28974 -> True, 9
-def high_card(full_hand):
-    full_hand_numbers = [card.number for card in full_hand]
-    if 1 in full_hand_numbers:  # Ace
-        return 14
-    return max(full_hand_numbers)
+    return strength_to_rank(evaluate(full_hand))
+
+
+# -------------------- Batch Evaluation --------------------
+# numpy is only needed by the batch API, so it is imported on first use rather than at server start
+_batch_tables = None
+
+
+def _get_batch_tables():
+    global _batch_tables
+    if _batch_tables is None:
+        import numpy as np
+        top_rank = np.array(TOP_RANK, dtype=np.int32)
+        top_bit = np.where(top_rank > 0, np.left_shift(1, np.maximum(top_rank - 2, 0)), 0).astype(np.int32)
+        _batch_tables = (np, np.array(POPCOUNT, dtype=np.int32), top_rank, top_bit,
+                         np.array(TOP_FIVE, dtype=np.int32), np.array(STRAIGHT_HIGH, dtype=np.int32))
+    return _batch_tables
+
+
+# Scores an (N, k) array of encoded cards (1 <= k <= 7) and returns the N strengths as an
+# int32 array.  Every row gives exactly the value evaluate() would return for it.
+def rank_hands_batch(cards):
+    np, popcount, top_rank, top_bit, top_five, straight_high = _get_batch_tables()
+    cards = np.asarray(cards, dtype=np.int64)
+    if cards.ndim != 2 or not 1 <= cards.shape[1] <= 7:
+        raise ValueError(f"expected an (N, 1..7) array of cards, got shape {cards.shape}")
+
+    global evaluations
+    evaluations += len(cards)
+    card_mask = np.left_shift(1, 13 * (cards & 3) + (cards >> 2)).sum(axis=1)
+    suit_masks = [(card_mask >> shift & 0x1FFF).astype(np.int32) for shift in (0, 13, 26, 39)]
+    hearts, diamonds, clubs, spades = suit_masks
+
+    # with seven cards at most one suit can hold a flush
+    flush_mask = np.zeros(len(cards), dtype=np.int32)
+    for suit_mask in suit_masks:
+        flush_mask |= np.where(popcount[suit_mask] >= 5, suit_mask, 0)
+    flush_high = straight_high[flush_mask]
+    flush_value = np.where(flush_high > 0,
+                           STRAIGHT_FLUSH << CATEGORY_SHIFT | flush_high << 16,
+                           FLUSH << CATEGORY_SHIFT | top_five[flush_mask])
+
+    ranks = hearts | diamonds | clubs | spades
+    quads = hearts & diamonds & clubs & spades
+    pairs = (hearts & diamonds) | (clubs & spades) | ((hearts | diamonds) & (clubs | spades))
+    trips = (hearts & diamonds & (clubs | spades)) | (clubs & spades & (hearts | diamonds))
+
+    quad_bit = top_bit[quads]
+    quads_value = FOUR_OF_A_KIND << CATEGORY_SHIFT | top_rank[quads] << 16 | top_rank[ranks ^ quad_bit] << 12
+
+    trips_bit = top_bit[trips]
+    other_pairs = pairs ^ trips_bit
+    full_house_value = FULL_HOUSE << CATEGORY_SHIFT | top_rank[trips] << 16 | top_rank[other_pairs] << 12
+
+    high = straight_high[ranks]
+    straight_value = STRAIGHT << CATEGORY_SHIFT | high << 16
+
+    trips_value = (THREE_OF_A_KIND << CATEGORY_SHIFT | top_rank[trips] << 16
+                   | top_five[ranks ^ trips_bit] >> 4 & 0xFF00)
+
+    high_pair_bit = top_bit[pairs]
+    low_pairs = pairs ^ high_pair_bit
+    low_pair_bit = top_bit[low_pairs]
+    two_pair_value = (TWO_PAIR << CATEGORY_SHIFT | top_rank[pairs] << 16 | top_rank[low_pairs] << 12
+                      | top_rank[ranks ^ high_pair_bit ^ low_pair_bit] << 8)
+    one_pair_value = ONE_PAIR << CATEGORY_SHIFT | top_rank[pairs] << 16 | top_five[ranks ^ high_pair_bit] >> 4 & 0xFFF0
+
+    high_card_value = HIGH_CARD << CATEGORY_SHIFT | top_five[ranks]
+
+    # same precedence as evaluate_masks
+    return np.select(
+        [flush_mask > 0, quads > 0, (trips > 0) & (other_pairs > 0), high > 0, trips > 0, low_pairs > 0, pairs > 0],
+        [flush_value, quads_value, full_house_value, straight_value, trips_value, two_pair_value, one_pair_value],
+        default=high_card_value,
+    ).astype(np.int32)
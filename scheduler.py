@@ -0,0 +1,72 @@
+"""
+CS 3050 Poker Game - scheduler.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import heapq
+import itertools
+import time
+import traceback
+
+TICK = 0.05  # seconds between checks for due timers
+
+
+# Runs delayed table transitions (showdown pause, next hand, board runout) from one
+# background task so handlers return right away instead of sleeping.  Every timer
+# belongs to a key (the table's room) so a table's pending transitions can be dropped
+# together.  start_task and sleep are socketio.start_background_task and socketio.sleep
+# in the server.
+class Scheduler:
+    def __init__(self, start_task, sleep, tick=TICK, clock=time.monotonic):
+        self.start_task = start_task
+        self.sleep = sleep
+        self.tick = tick
+        self.clock = clock
+        self.timers = []  # min-heap of [due, seq, key, callback, args]
+        self.pending = {}  # key -> timers not yet run
+        self._seq = itertools.count()
+        self.running = False
+
+    def schedule(self, key, delay, callback, *args):
+        timer = [self.clock() + delay, next(self._seq), key, callback, args]
+        heapq.heappush(self.timers, timer)
+        self.pending.setdefault(key, []).append(timer)
+        if not self.running:
+            self.running = True
+            self.start_task(self._run)
+        return timer
+
+    # Drops every pending timer for the key; they stay in the heap but never fire
+    def cancel(self, key):
+        for timer in self.pending.pop(key, ()):
+            timer[3] = None
+
+    def has_pending(self, key):
+        return bool(self.pending.get(key))
+
+    # Runs every timer that is due, returns how many ran
+    def run_due(self):
+        ran = 0
+        now = self.clock()
+        while self.timers and self.timers[0][0] <= now:
+            timer = heapq.heappop(self.timers)
+            _, _, key, callback, args = timer
+            if callback is None:
+                continue
+            waiting = self.pending.get(key)
+            if waiting is not None:
+                waiting.remove(timer)
+                if not waiting:
+                    del self.pending[key]
+            try:
+                callback(*args)
+            except Exception:
+                # one table's bad transition must not stop every other table's clock
+                traceback.print_exc()
+            ran += 1
+        return ran
+
+    def _run(self):
+        while True:
+            self.run_due()
+            self.sleep(self.tick)
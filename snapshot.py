@@ -0,0 +1,319 @@
+"""
+CS 3050 Poker Game - snapshot.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+Crash recovery for live tables.  Every table that changed is marked dirty; flush()
+encodes just those tables and a background thread appends them to one log file:
+
+  file   = b"PKSN" + u32 version, then records
+  record = u32 body length, u32 crc32 of the body, body
+  body   = u8 codec, u8 table id length, table id, state (empty once the table is gone)
+
+The state is a positional list, msgpack encoded when msgpack is installed and JSON
+otherwise; the codec byte says which.  The last record for a table wins, and the id
+is outside the state so reading the log only decodes those.  When the log has grown
+to several times the size of the live tables it is rewritten with only those (to a
+temporary file, then renamed over the old one).  On boot load() reads the log back and
+restore_table() rebuilds each Table, game, players, pot and deck order included.
+"""
+
+import json
+import os
+import struct
+import zlib
+
+try:
+    # a real OS thread and queue even when eventlet has patched the stdlib
+    from eventlet.patcher import original
+    threading = original("threading")
+    queue = original("queue")
+except ImportError:
+    import queue
+    import threading
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, snapshots are JSON without it
+    msgpack = None
+
+from tables import Table
+
+MAGIC = b"PKSN"
+VERSION = 3
+FILE_HEADER = struct.Struct("<4sI")
+RECORD_HEADER = struct.Struct("<II")  # body length, crc32
+BODY_HEADER = struct.Struct("<BB")  # codec, table id length
+JSON, MSGPACK = 0, 1
+
+FLUSH_INTERVAL = 0.25  # seconds between flushes of the dirty tables
+COMPACT_MIN_BYTES = 4 * 1024 * 1024  # never rewrite a log smaller than this
+COMPACT_RATIO = 4  # rewrite once the log is this many times the live snapshots
+
+
+# -------------------- Encoding --------------------
+# Fields are positional to keep records small
+def _encode_player(player):
+    return [player.uuid, player.index, player.name, player.chips, player.seats.bets[player.index],
+            player.seat_position, list(player.hand), player.seat_position_flag, player.folded,
+            player.current_bet, player.is_ready, player.acted_this_round, player.time_bank,
+            player.card_mask, player.hand_strength, player.hand_rank]
+
+
+def _encode_history(recorder):
+    if recorder is None:
+        return None
+    return [recorder.hand_number, recorder.seed, [list(seat) for seat in recorder.seats],
+            [list(action) for action in recorder.actions]]
+
+
+def encode_table(table):
+    game = table.game
+    state = [
+        table.seat_count, table.seat_of, table.tokens,
+        [_encode_player(player) for player in game.players.values()],
+        game.deck.cards, game.community_cards, game.turn_order, game.current_turn_index,
+        game.round_active, game.seed_state, game.hand_seed, game.current_bet,
+        game.minimum_raise, game.maximum_bet, game.street, game.last_aggressor,
+        game.state_version, game.pot.amount, game.pot.contributions, _encode_history(game.history),
+        table.stake,
+    ]
+    return _body(table.table_id, state)
+
+
+# Record body for a table's state, or for its removal when state is None
+def _body(table_id, state):
+    table_key = str(table_id).encode()
+    if state is None:
+        return BODY_HEADER.pack(JSON, len(table_key)) + table_key
+    if msgpack is not None:
+        return BODY_HEADER.pack(MSGPACK, len(table_key)) + table_key + msgpack.packb(state)
+    return BODY_HEADER.pack(JSON, len(table_key)) + table_key + json.dumps(state, separators=(",", ":")).encode()
+
+
+# (table_id, codec, offset of the state) without decoding the state
+def _split(body):
+    codec, key_length = BODY_HEADER.unpack_from(body, 0)
+    start = BODY_HEADER.size
+    return body[start:start + key_length].decode(), codec, start + key_length
+
+
+# (table_id, state), state None when the record says the table is gone
+def decode_table(body):
+    table_id, codec, offset = _split(body)
+    if offset == len(body):
+        return table_id, None
+    if codec == MSGPACK:
+        return table_id, msgpack.unpackb(body[offset:])
+    return table_id, json.loads(body[offset:])
+
+
+# -------------------- Restoring --------------------
+def _restore_player(game, fields):
+    (uuid, index, name, chips, street_bet, seat_position, hand, seat_position_flag, folded,
+     current_bet, is_ready, acted_this_round, time_bank, card_mask, hand_strength, (category, high)) = fields
+    # same seat index as before, the turn order refers to it
+    game.add_player(name, uuid, seat_position, seat_position_flag, is_ready, index=index)
+    player = game.players[uuid]
+    player.chips = chips
+    game.seats.bets[index] = street_bet
+    player.hand = hand
+    player.folded = folded
+    player.current_bet = current_bet
+    player.acted_this_round = acted_this_round
+    player.time_bank = time_bank
+    player.card_mask = card_mask
+    player.hand_strength = hand_strength
+    # JSON has no tuples; two pair and full house carry two high cards
+    player.hand_rank = (category, tuple(high) if isinstance(high, list) else high)
+
+
+# Rebuilds a Table from decode_table's state.  history is the HandHistoryWriter for the
+# table's recorder, as in TableRegistry.
+def restore_table(table_id, state, history=None):
+    (seat_count, seat_of, tokens, players, cards, community_cards, turn_order,
+     current_turn_index, round_active, seed_state, hand_seed, current_bet,
+     minimum_raise, maximum_bet, street, last_aggressor, state_version, pot_amount,
+     pot_contributions, recorded, stake) = state
+
+    table = Table(table_id, seat_count, history, stake)
+    table.seat_of = seat_of
+    table.free_seats = sorted(set(range(1, seat_count + 1)) - set(seat_of.values()))
+    table.tokens = tokens
+
+    game = table.game
+    for fields in players:
+        _restore_player(game, fields)
+    game.deck.cards = cards
+    game.community_cards = community_cards
+    game.turn_order = turn_order
+    game.current_turn_index = current_turn_index
+    game.round_active = round_active
+    game.seed_state = seed_state
+    game.hand_seed = hand_seed
+    game.current_bet = current_bet
+    game.minimum_raise = minimum_raise
+    game.maximum_bet = maximum_bet
+    game.street = street
+    game.last_aggressor = last_aggressor
+    # clients all come back with a full snapshot, versions just keep counting up
+    game.state_version = state_version
+    game.pot.amount = pot_amount
+    game.pot.contributions = pot_contributions
+    game.rebuild_betting_state()
+
+    if game.history is not None and recorded is not None:
+        recorder = game.history
+        recorder.hand_number, recorder.seed, seats, actions = recorded
+        recorder.seats = [(position, uuid, name, chips, tuple(cards)) for position, uuid, name, chips, cards in seats]
+        recorder.actions = [tuple(action) for action in actions]
+        recorder.seat_index = {seat[1]: index for index, seat in enumerate(recorder.seats)}
+    return table
+
+
+# -------------------- Store --------------------
+# One log file of table snapshots.  mark() is all the event loop does per change; the
+# encoding happens once per flush however many actions the table saw, and the file
+# writes happen on the store's own thread.
+class SnapshotStore:
+    def __init__(self, path, compact_min_bytes=COMPACT_MIN_BYTES):
+        self.path = path
+        self.compact_min_bytes = compact_min_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.dirty = {}  # table_id -> Table, or None once the table is gone
+        self.latest = {}  # table_id -> last record body, what a compaction keeps
+        self.skipped_version = None  # version of a log written with another state layout, left unread
+        self._read()
+        self.running = False
+        self.queue = queue.SimpleQueue()
+        self.file = None
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, name="snapshots", daemon=True)
+        self.thread.start()
+
+    def mark(self, table):
+        self.dirty[table.table_id] = table
+
+    def drop(self, table_id):
+        self.dirty[table_id] = None
+
+    # Encodes every dirty table and hands the records to the writer thread; empty
+    # tables are written as gone.  Returns how many tables were written.
+    def flush(self):
+        if not self.dirty:
+            return 0
+        dirty, self.dirty = self.dirty, {}
+        for table_id, table in dirty.items():
+            if table is None or table.is_empty():
+                self.queue.put(_body(table_id, None))
+            else:
+                self.queue.put(encode_table(table))
+        return len(dirty)
+
+    # Flushes every FLUSH_INTERVAL seconds on a background task of the caller's event
+    # loop (socketio.start_background_task / socketio.sleep on the server)
+    def start(self, start_task, sleep, interval=FLUSH_INTERVAL):
+        if self.running:
+            return
+        self.running = True
+        start_task(self._flush_loop, sleep, interval)
+
+    def _flush_loop(self, sleep, interval):
+        while self.running:
+            sleep(interval)
+            self.flush()
+
+    def close(self):
+        self.running = False
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    # {table_id: state} for every table in the log when the store was opened; call it
+    # before the first flush
+    def load(self):
+        return dict(decode_table(body) for body in self.latest.values())
+
+    # Fills self.latest with the last record of every table still in the log
+    def _read(self):
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if len(data) < FILE_HEADER.size:
+            return
+        magic, version = FILE_HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a snapshot log")
+        if version != VERSION:
+            # written by a server with another state layout; start without those tables
+            self.skipped_version = version
+            return
+        offset = FILE_HEADER.size
+        while offset + RECORD_HEADER.size <= len(data):
+            length, crc = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            body = data[start:start + length]
+            # a torn or corrupt tail (the server died mid-write) ends the log
+            if len(body) < length or zlib.crc32(body) != crc:
+                break
+            table_id, _, state_offset = _split(body)
+            if state_offset == len(body):
+                self.latest.pop(table_id, None)
+            else:
+                self.latest[table_id] = body
+            offset = start + length
+
+    # -------------------- Writer thread --------------------
+    def _write_record(self, f, body):
+        f.write(RECORD_HEADER.pack(len(body), zlib.crc32(body)))
+        f.write(body)
+        return RECORD_HEADER.size + len(body)
+
+    # Rewrites the log with only the live tables, so restore never reads dead records
+    def _compact(self):
+        if self.file is not None:
+            self.file.close()
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(FILE_HEADER.pack(MAGIC, VERSION))
+            written = FILE_HEADER.size
+            for body in self.latest.values():
+                written += self._write_record(f, body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.file = open(self.path, "ab")
+        self.written = written
+
+    def _run(self):
+        live_bytes = sum(RECORD_HEADER.size + len(body) for body in self.latest.values())
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for item in batch:
+                if item is None:
+                    if self.file is not None:
+                        self.file.close()
+                    return
+                if self.file is None:
+                    # the log is only touched once there is something to write, starting
+                    # from a compacted copy of what was restored
+                    self._compact()
+                table_id, _, state_offset = _split(item)
+                previous = self.latest.pop(table_id, None)
+                if previous is not None:
+                    live_bytes -= RECORD_HEADER.size + len(previous)
+                if state_offset < len(item):
+                    self.latest[table_id] = item
+                    live_bytes += RECORD_HEADER.size + len(item)
+                self.written += self._write_record(self.file, item)
+            self.file.flush()
+            if self.written > max(self.compact_min_bytes, COMPACT_RATIO * live_bytes):
+                self._compact()
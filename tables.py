@@ -0,0 +1,162 @@
+"""
+CS 3050 Poker Game - tables.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import heapq
+import itertools
+import secrets
+
+from game import PokerGame
+from handhistory import HandRecorder
+from matchmaking import DEFAULT_STAKE, Matchmaker
+
+SEATS_PER_TABLE = 8  # matches the client's SEAT_COUNT
+
+
+class Table:
+    # stake is the ante every hand at this table is played for
+    def __init__(self, table_id, seat_count=SEATS_PER_TABLE, history=None, stake=DEFAULT_STAKE):
+        self.table_id = table_id
+        self.room = f"table:{table_id}"  # Socket.IO room every member of the table joins
+        self.stake = stake
+        self.game = PokerGame()
+        self.game.ante = stake
+        if history is not None:
+            self.game.history = HandRecorder(history, table_id)
+        self.seat_count = seat_count
+        self.free_seats = list(range(1, seat_count + 1))  # min-heap, lowest open seat first
+        self.seat_of = {}  # uuid -> seat
+        # token -> uuid; a player who reconnects with their token gets their seat back
+        self.tokens = {}
+        # seated players that have not reconnected since the table was restored from a snapshot
+        self.away = set()
+
+    def take_seat(self, uuid):
+        if not self.free_seats:
+            return None
+        seat = heapq.heappop(self.free_seats)
+        self.seat_of[uuid] = seat
+        self.tokens[secrets.token_urlsafe(16)] = uuid
+        return seat
+
+    def release_seat(self, uuid):
+        seat = self.seat_of.pop(uuid, None)
+        if seat is not None:
+            heapq.heappush(self.free_seats, seat)
+            self.tokens = {token: owner for token, owner in self.tokens.items() if owner != uuid}
+            self.away.discard(uuid)
+        return seat
+
+    def token_of(self, uuid):
+        return next((token for token, owner in self.tokens.items() if owner == uuid), None)
+
+    # Moves a seat (and the player in the game) from an old socket id to a new one
+    def rekey(self, old_uuid, new_uuid):
+        self.seat_of = {new_uuid if uuid == old_uuid else uuid: seat for uuid, seat in self.seat_of.items()}
+        self.tokens = {token: new_uuid if owner == old_uuid else owner for token, owner in self.tokens.items()}
+        self.away.discard(old_uuid)
+        self.game.rekey_player(old_uuid, new_uuid)
+
+    def is_full(self):
+        return not self.free_seats
+
+    def is_empty(self):
+        return not self.seat_of
+
+
+# Maps table ids to tables and every connected socket to the table it sits at
+# owns(table_id) says whether this worker hosts a table (see cluster.py); new table ids
+# are only handed out from the ones it owns.  history is the HandHistoryWriter every
+# table logs its hands to, if any.
+class TableRegistry:
+    def __init__(self, seat_count=SEATS_PER_TABLE, owns=None, history=None):
+        self.seat_count = seat_count
+        self.owns = owns or (lambda table_id: True)
+        self.history = history
+        self.tables = {}
+        self.table_of = {}  # uuid -> table_id
+        self.matchmaker = Matchmaker()  # tables with a free seat, by stake and size
+        self.token_tables = {}  # rejoin token -> table_id
+        self._ids = itertools.count(1)
+
+    def create_table(self, table_id=None, stake=DEFAULT_STAKE, seat_count=None):
+        if table_id is None:
+            table_id = str(next(self._ids))
+            while table_id in self.tables or not self.owns(table_id):
+                table_id = str(next(self._ids))
+        table = Table(table_id, seat_count or self.seat_count, self.history, stake)
+        self.tables[table_id] = table
+        self.matchmaker.update(table)
+        return table
+
+    def get(self, table_id):
+        return self.tables.get(table_id)
+
+    def table_for(self, uuid):
+        table_id = self.table_of.get(uuid)
+        return self.tables.get(table_id) if table_id is not None else None
+
+    # Seats a player at the requested table (created on demand) or, through the
+    # matchmaker, at the fullest table of that stake and size with a free seat (a new
+    # one if they are all full).  Returns (table, seat), or (None, None) if the requested
+    # table is full.
+    def join(self, uuid, table_id=None, stake=DEFAULT_STAKE, seat_count=None):
+        if uuid in self.table_of:
+            table = self.table_for(uuid)
+            return table, table.seat_of[uuid]
+
+        if table_id is not None:
+            table = self.tables.get(table_id) or self.create_table(table_id, stake, seat_count)
+        else:
+            seat_count = seat_count or self.seat_count
+            table = (self.matchmaker.best_table(stake, seat_count)
+                     or self.create_table(stake=stake, seat_count=seat_count))
+
+        seat = table.take_seat(uuid)
+        if seat is None:
+            return None, None
+        self.table_of[uuid] = table.table_id
+        self.token_tables[table.token_of(uuid)] = table.table_id
+        self.matchmaker.update(table)
+        return table, seat
+
+    # Gives a player who was away (see Table.away) their seat back under a new socket id.
+    # Returns (table, seat, old uuid), or (None, None, None) if the token holds no seat.
+    def rejoin(self, token, uuid):
+        table = self.tables.get(self.token_tables.get(token))
+        old_uuid = table.tokens.get(token) if table is not None else None
+        if old_uuid is None or old_uuid not in table.away:
+            return None, None, None
+        table.rekey(old_uuid, uuid)
+        del self.table_of[old_uuid]
+        self.table_of[uuid] = table.table_id
+        return table, table.seat_of[uuid], old_uuid
+
+    # Adds a table rebuilt from a snapshot; everyone seated at it is away until they rejoin
+    def restore(self, table):
+        self.tables[table.table_id] = table
+        self.matchmaker.update(table)
+        for uuid in table.seat_of:
+            self.table_of[uuid] = table.table_id
+        for token in table.tokens:
+            self.token_tables[token] = table.table_id
+        table.away = set(table.seat_of)
+
+    # Frees the player's seat; empty tables are dropped.  Returns the table they left.
+    def leave(self, uuid):
+        table_id = self.table_of.pop(uuid, None)
+        table = self.tables.get(table_id)
+        if table is None:
+            return None
+        self.token_tables.pop(table.token_of(uuid), None)
+        table.release_seat(uuid)
+        if table.is_empty():
+            del self.tables[table_id]
+            self.matchmaker.update(table, closed=True)
+        else:
+            self.matchmaker.update(table)
+        return table
+
+    def player_count(self):
+        return len(self.table_of)
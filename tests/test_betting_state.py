@@ -0,0 +1,274 @@
+"""
+CS 3050 Poker Game - test_betting_state.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+PokerGame keeps its betting counters and the ring of live seats up to date action by
+action (see rebuild_betting_state).  These tests play random hands, with players joining
+and leaving mid-hand, and after every step compare that state to a recount from scratch,
+and every betting call to the scan-based rules the counters replaced.
+"""
+
+import random
+
+import pytest
+
+from game import PokerGame
+
+ACTIONS = ("fold", "check", "call", "bet", "raise", "allin", "check", "call")
+AMOUNTS = (0, 5, 10, 20, 50, 100, 500)
+CHIPS = (5, 15, 30, 60, 200, 1000)
+
+
+# (contenders, active, pending, live seats in turn order) counted from the seat arrays
+def recount(game):
+    seats = game.seats
+    counted = game.turn_order if game.round_active else game.occupied
+    contenders = [index for index in counted if not seats.folded[index]]
+    active = [index for index in contenders if seats.chips[index] > 0]
+    pending = [index for index in active
+               if seats.acted[index] != seats.epoch or seats.bets[index] < game.current_bet]
+    live = [index for index in game.turn_order if not seats.folded[index] and seats.chips[index] > 0]
+    return len(contenders), len(active), len(pending), live
+
+
+def check_state(game):
+    contenders, active, pending, live = recount(game)
+    assert (game.contenders, game.active, game.pending) == (contenders, active, pending)
+    assert game.live == len(live)
+    if not live:
+        return
+    # the ring links the live seats in turn order, both ways
+    after, before = game.seats.after, game.seats.before
+    for turn, index in enumerate(live):
+        assert after[index] == live[(turn + 1) % len(live)]
+        assert before[index] == live[turn - 1]
+    # any dealt-in seat finds the next live one after it
+    order = game.turn_order
+    for turn, index in enumerate(order):
+        following = next(order[(turn + step) % len(order)] for step in range(1, len(order) + 1)
+                         if order[(turn + step) % len(order)] in live)
+        assert game._next_live(index) == following
+
+
+# The betting rules as they were before the counters, on plain lists: apply_action,
+# advance_turn, is_betting_round_complete and maximum_bet look at every seat again on
+# every call.  A player seated after the deal sits the hand out and cannot act.  It
+# plays along with a game and takes the game's state over after anything that is not
+# betting (a deal, a new street, a player joining or leaving).
+class ReferenceBetting:
+    def __init__(self, game):
+        self.game = game
+        self.sync()
+
+    def sync(self):
+        game, seats = self.game, self.game.seats
+        self.chips = list(seats.chips)
+        self.bets = list(seats.bets)
+        self.folded = [bool(folded) for folded in seats.folded]
+        self.acted = [acted == seats.epoch for acted in seats.acted]
+        self.current_bet = game.current_bet
+        self.minimum_raise = game.minimum_raise
+        self.maximum_bet = game.maximum_bet
+        self.pot = game.pot.amount
+        self.occupied = list(game.occupied)
+        self.turn_order = list(game.turn_order)
+        self.current_turn_index = game.current_turn_index
+        self.round_active = game.round_active
+        self.street = game.street
+
+    # The game's state has to be what these rules left
+    def check(self):
+        game, seats = self.game, self.game.seats
+        for index in self.occupied:
+            assert seats.chips[index] == self.chips[index]
+            assert seats.bets[index] == self.bets[index]
+            assert bool(seats.folded[index]) == self.folded[index]
+            assert (seats.acted[index] == seats.epoch) == self.acted[index]
+        assert (game.current_bet, game.maximum_bet, game.pot.amount) == (self.current_bet, self.maximum_bet, self.pot)
+        assert (game.current_turn_index, game.street) == (self.current_turn_index, self.street)
+
+    def _aggressive(self, index):
+        self.acted = [False] * len(self.acted)
+        self.acted[index] = True
+
+    def apply_action(self, uuid, action, amount=0):
+        chips, bets = self.chips, self.bets
+        for index in self.occupied:
+            if chips[index] < self.maximum_bet:
+                self.maximum_bet = chips[index]
+
+        p = self.game.players.get(uuid)
+        if not p or p.index not in self.turn_order:
+            return False, "Invalid player state."
+        seat = p.index
+        if self.folded[seat] or chips[seat] == 0:
+            return False, "Invalid player state."
+        my_contribution = bets[seat]
+        price_to_call = max(0, self.current_bet - my_contribution)
+
+        if action == "fold":
+            self.folded[seat] = True
+            self.acted[seat] = True
+            return True, f"{p.name} folded."
+        if action == "check":
+            if price_to_call > 0:
+                return False, "Cannot check facing a bet."
+            self.acted[seat] = True
+            return True, f"{p.name} checked."
+        if action == "call":
+            if price_to_call == 0:
+                return False, "Nothing to call."
+            to_put = min(price_to_call, chips[seat])
+            chips[seat] -= to_put
+            self.pot += to_put
+            bets[seat] = my_contribution + to_put
+            self.acted[seat] = True
+            return True, f"{p.name} called."
+        if action == "bet":
+            if self.current_bet > 0:
+                return False, "Bet not allowed; use raise."
+            if amount < self.minimum_raise:
+                return False, f"Minimum bet is {self.minimum_raise}."
+            if amount > chips[seat]:
+                return False, "Not enough chips."
+            if amount > self.maximum_bet:
+                return False, "Bet is more than the least common denominator."
+            chips[seat] -= amount
+            self.pot += amount
+            bets[seat] = my_contribution + amount
+            self.current_bet = bets[seat]
+            self._aggressive(seat)
+            return True, f"{p.name} bet {amount}."
+        if action == "raise":
+            if price_to_call == 0:
+                return False, "Cannot raise when no bet to call."
+            total_needed = price_to_call + amount
+            if amount < self.minimum_raise and chips[seat] > price_to_call:
+                return False, f"Minimum raise is {self.minimum_raise}."
+            if total_needed > chips[seat]:
+                return False, "Not enough chips."
+            chips[seat] -= total_needed
+            self.pot += total_needed
+            bets[seat] = my_contribution + total_needed
+            self.current_bet = bets[seat]
+            self._aggressive(seat)
+            return True, f"{p.name} raised by {amount}."
+        if action == "allin":
+            to_put = chips[seat]
+            chips[seat] = 0
+            self.pot += to_put
+            bets[seat] = my_contribution + to_put
+            if bets[seat] > self.current_bet:
+                self.current_bet = bets[seat]
+                self._aggressive(seat)
+                return True, f"{p.name} went all-in for {to_put}."
+            self.acted[seat] = True
+            return True, f"{p.name} called all-in."
+        return False, "Unknown action."
+
+    # seat index of the next player to act, None if nobody can
+    def advance_turn(self):
+        order = self.turn_order
+        for _ in range(len(order)):
+            self.current_turn_index = (self.current_turn_index + 1) % len(order)
+            index = order[self.current_turn_index]
+            if not self.folded[index] and self.chips[index] > 0:
+                return index
+        return None
+
+    def is_betting_round_complete(self):
+        counted = self.turn_order if self.round_active else self.occupied
+        active = [index for index in counted if not self.folded[index] and self.chips[index] > 0]
+        if len(active) <= 1:
+            self.street = "river"
+            return True
+        return all(self.acted[index] and self.bets[index] >= self.current_bet for index in active)
+
+
+class RandomTable:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.game = PokerGame(seed=seed)
+        self.joined = 0
+        self.reference = ReferenceBetting(self.game)
+        for _ in range(self.rng.randint(2, 6)):
+            self.add_player()
+
+    def add_player(self):
+        self.joined += 1
+        uuid = f"u{self.joined}"
+        self.game.add_player(f"Player {self.joined}", uuid, seat_position=self.joined, seat_position_flag=0,
+                             is_ready=True)
+        self.game.players[uuid].chips = self.rng.choice(CHIPS)
+        self.reference.sync()
+        return uuid
+
+    # One action by the player to act (now and then someone else, which is refused),
+    # then the hand moves along the way app.process_action moves it
+    def act(self):
+        game, rng, reference = self.game, self.rng, self.reference
+        if rng.random() < 0.9:
+            uuid = game.current_player().uuid
+        else:
+            uuid = rng.choice(list(game.players))
+        action, amount = rng.choice(ACTIONS), rng.choice(AMOUNTS)
+        assert game.apply_action(uuid, action, amount) == reference.apply_action(uuid, action, amount)
+        reference.check()
+        check_state(game)
+        complete = game.is_betting_round_complete()
+        assert complete == reference.is_betting_round_complete()
+        reference.check()
+        if not complete:
+            actor = game.advance_turn()
+            assert (actor.index if actor else None) == reference.advance_turn()
+            reference.check()
+        elif game.street != "river":
+            game.move_to_next_street()
+            reference.sync()
+        else:
+            if game.is_all_in() and len(game.community_cards) < 5:
+                game.deal_runout()
+            game.showdown()
+            check_state(game)
+            game.reset_round()
+            reference.sync()
+
+    def step(self):
+        game, rng = self.game, self.rng
+        roll = rng.random()
+        if roll < 0.05 and len(game.players) < 9:
+            self.add_player()
+        elif roll < 0.08 and len(game.players) > 2:
+            game.on_disconnect(rng.choice(list(game.players)))
+            self.reference.sync()
+        elif not game.round_active:
+            for player in game.players.values():
+                if player.chips < 5:
+                    player.chips = rng.choice(CHIPS)
+            game.start_round()
+            self.reference.sync()
+        else:
+            self.act()
+        check_state(game)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_incremental_state_matches_a_recount(seed):
+    table = RandomTable(seed)
+    for _ in range(150):
+        table.step()
+
+
+def test_hand_with_a_player_seated_mid_hand_finishes():
+    for seed in range(50):
+        table = RandomTable(seed)
+        game = table.game
+        game.start_round()
+        table.reference.sync()
+        table.add_player()
+        check_state(game)
+        for _ in range(200):
+            if not game.round_active:
+                break
+            table.act()
+        assert not game.round_active, f"seed {seed}: the hand never finished"
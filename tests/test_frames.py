@@ -0,0 +1,26 @@
+"""
+CS 3050 Poker Game - test_frames.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import wire
+from frames import Frame
+from tables import Table
+
+
+def test_flush_meters_every_event_inside_the_frames():
+    table = Table("1")
+    table.take_seat("a")
+    table.take_seat("b")
+    frame = Frame(table)
+    frame.add('message', "A player has disconnected.")
+    frame.add_private("a", 'hand', [0, 1])
+    sent = []
+    metered = []
+    frame.flush(lambda event, data, to: sent.append((event, to)),
+                meter=lambda event, size: metered.append((event, size)))
+
+    assert sent == [("frame", "a"), ("frame", "b")]
+    message_size = wire.event_size('message', "A player has disconnected.")
+    assert sorted(metered) == sorted([('message', message_size), ('hand', wire.event_size('hand', [0, 1])),
+                                      ('message', message_size)])
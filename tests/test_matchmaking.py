@@ -0,0 +1,79 @@
+"""
+CS 3050 Poker Game - test_matchmaking.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+from tables import TableRegistry
+
+
+# Seats uuid through the registry and at the table's game, as handle_set_name does
+def join(registry, uuid, **pool):
+    table, seat = registry.join(uuid, **pool)
+    table.game.add_player(f"Player {seat}", uuid, seat_position=seat, seat_position_flag=0, is_ready=True)
+    return table
+
+
+# Everyone still in checks or calls until the hand is over, the way the action clock
+# plays for absent players; returns the showdown result
+def play_out(game, max_actions=100):
+    for _ in range(max_actions):
+        if game.is_betting_round_complete():
+            if game.street == "river":
+                if game.is_all_in() and len(game.community_cards) < 5:
+                    game.deal_runout()
+                return game.showdown()
+            game.move_to_next_street()
+            continue
+        player = game.current_player()
+        action = "check" if "check" in game.get_available_actions(player.uuid) else "call"
+        ok, message = game.apply_action(player.uuid, action)
+        assert ok, message
+        if not game.is_betting_round_complete():
+            game.advance_turn()
+    raise AssertionError("the hand never finished")
+
+
+def test_fills_the_fullest_open_table_first():
+    registry = TableRegistry()
+    first = [join(registry, f"a{i}") for i in range(8)]
+    second = join(registry, "b0")
+    assert len({table.table_id for table in first}) == 1
+    assert second is not first[0]
+
+    registry.leave("a0")
+    registry.leave("a1")
+    assert join(registry, "c0") is first[0]
+
+
+def test_pools_are_kept_apart():
+    registry = TableRegistry()
+    low = join(registry, "a", stake=5, seat_count=2)
+    high = join(registry, "b", stake=50, seat_count=2)
+    assert low is not high
+    assert (low.stake, low.game.ante) == (5, 5)
+    assert join(registry, "c", stake=5, seat_count=2) is low
+    assert join(registry, "d", stake=5, seat_count=2) is not low
+
+
+def test_player_seated_mid_hand_waits_for_the_next_deal():
+    registry = TableRegistry()
+    table = join(registry, "a")
+    join(registry, "b")
+    game = table.game
+    game.start_round(hand_seed=7)
+
+    # the matchmaker puts the newcomer at the table while the hand is being played
+    assert join(registry, "c") is table
+    assert not game.in_hand("c")
+    assert game.apply_action("c", "check") == (False, "Invalid player state.")
+
+    result = play_out(game)
+    assert set(result["payouts"]) <= {"a", "b"}
+    # the whole pot went to the two players who were dealt in
+    assert game.players["a"].chips + game.players["b"].chips == 2000
+    assert game.players["c"].chips == 1000
+
+    game.reset_round()
+    game.start_round()
+    assert game.in_hand("c")
+    play_out(game)
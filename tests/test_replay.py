@@ -0,0 +1,85 @@
+"""
+CS 3050 Poker Game - test_replay.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import random
+
+import pytest
+
+import handhistory
+from game import PokerGame
+from replay import replay_hand
+
+ACTIONS = ("fold", "check", "call", "bet", "raise", "allin", "check", "call")
+AMOUNTS = (0, 10, 20, 50, 200)
+
+
+# Plays random hands with a recorder on, now and then someone leaving mid-hand the way
+# app.drop_player handles it; returns the recorded hands
+def record_hands(seed, hands=20):
+    rng = random.Random(seed)
+    records = []
+    game = PokerGame(seed=seed)
+    game.history = handhistory.HandRecorder(records, "t")
+    joined = 0
+    for _ in range(hands):
+        while len(game.players) < 4:
+            joined += 1
+            game.add_player(f"Player {joined}", f"u{joined}", seat_position=joined, seat_position_flag=0,
+                            is_ready=True)
+            game.players[f"u{joined}"].chips = rng.choice((100, 500, 1000))
+        game.reset_round()
+        game.start_round()
+        for _ in range(200):
+            if not game.round_active:
+                break
+            if rng.random() < 0.1:
+                result = game.on_disconnect(rng.choice(list(game.players)))
+                if result["ended_round"] is False and game.round_active:
+                    actor = game.current_player()
+                    if not actor or actor.folded or actor.chips == 0:
+                        game.advance_turn()
+                continue
+            game.apply_action(game.current_player().uuid, rng.choice(ACTIONS), rng.choice(AMOUNTS))
+            if not game.is_betting_round_complete():
+                game.advance_turn()
+            elif game.street != "river":
+                game.move_to_next_street()
+            else:
+                if game.is_all_in() and len(game.community_cards) < 5:
+                    game.deal_runout()
+                game.showdown()
+                break
+        for player in game.players.values():
+            if player.chips < 5:
+                player.chips = 500
+    return [handhistory.decode_hand(record) for record in records]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_recorded_hands_replay_the_same(seed):
+    hands = record_hands(seed)
+    assert hands
+    for hand in hands:
+        replayed = replay_hand(hand)
+        assert replayed.ok, replayed.mismatches
+
+
+def test_hands_with_a_player_leaving_are_recorded_and_replay_the_same():
+    hands = [hand for seed in range(20) for hand in record_hands(seed)
+             if any(action["action"] == "leave" for action in hand["actions"])]
+    assert hands
+    for hand in hands:
+        replayed = replay_hand(hand)
+        assert replayed.ok, replayed.mismatches
+        assert replayed.result["payouts"] == hand["payouts"]
+
+
+# bulk replay runs every hand of a process on one reseated game
+def test_one_game_replays_hand_after_hand():
+    game = PokerGame()
+    hands = [hand for seed in range(20) for hand in record_hands(seed)]
+    for hand in hands:
+        replayed = replay_hand(hand, game)
+        assert replayed.ok, replayed.mismatches
@@ -0,0 +1,72 @@
+"""
+CS 3050 Poker Game - test_snapshots.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import os
+
+# app sets the server up on import; these tests give it a snapshot store of their own
+# and keep it from writing logs or starting the equity pool
+os.environ["SNAPSHOT_DIR"] = ""
+os.environ["HAND_HISTORY_DIR"] = ""
+os.environ["LIVE_EQUITY"] = "0"
+
+import eventlet
+
+import app as server
+import snapshot
+
+
+# {table_id: state} in the log at path, as a restarting server would read it
+def read_log(path):
+    store = snapshot.SnapshotStore(path)
+    tables = store.load()
+    store.close()
+    return tables
+
+
+def test_an_action_reaches_the_snapshot_log(tmp_path):
+    path = str(tmp_path / "tables.snap")
+    server.snapshots = snapshot.SnapshotStore(path)
+    clients = [server.socketio.test_client(server.app) for _ in range(2)]
+    try:
+        for client in clients:
+            client.emit('set_name', {'player_name': 'x'})
+        for client in clients:
+            client.emit('ready', {'ready': True})
+        clients[0].emit('start_game', {})
+        table = next(iter(server.tables.tables.values()))
+        game = table.game
+        actor = game.current_player().uuid
+        client = next(client for client in clients
+                      if server.socketio.server.manager.sid_from_eio_sid(client.eio_sid, "/") == actor)
+        client.emit('player_action', {'action': 'check'})
+        assert game.current_player().uuid != actor
+
+        # no flush by hand: the store's own loop has to write it
+        state = None
+        for _ in range(40):
+            eventlet.sleep(snapshot.FLUSH_INTERVAL)
+            state = read_log(path).get(table.table_id)
+            if state is not None and snapshot.restore_table(table.table_id, state).game.pot.amount == game.pot.amount:
+                break
+        assert state is not None, "nothing reached the snapshot log"
+        restored = snapshot.restore_table(table.table_id, state).game
+        assert restored.pot.amount == game.pot.amount
+        assert restored.current_player().uuid == game.current_player().uuid
+    finally:
+        for client in clients:
+            client.disconnect()
+        server.snapshots.close()
+        server.snapshots = None
+
+
+def test_a_log_of_another_version_is_skipped_and_reported(tmp_path):
+    path = tmp_path / "tables.snap"
+    path.write_bytes(snapshot.FILE_HEADER.pack(snapshot.MAGIC, snapshot.VERSION - 1))
+    store = snapshot.SnapshotStore(str(path))
+    try:
+        assert store.load() == {}
+        assert store.skipped_version == snapshot.VERSION - 1
+    finally:
+        store.close()
@@ -0,0 +1,109 @@
+"""
+CS 3050 Poker Game - timingwheel.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+"""
+
+import math
+import time
+import traceback
+
+TICK = 0.1  # seconds per slot on the lowest wheel
+SLOTS = 64
+LEVELS = 4  # 64 ** 4 ticks at 0.1s is about 194 days
+
+
+class WheelTimer:
+    __slots__ = ("deadline", "callback", "args", "bucket")
+
+    def __init__(self, deadline, callback, args):
+        self.deadline = deadline  # in ticks
+        self.callback = callback
+        self.args = args
+        self.bucket = None
+
+
+# Hierarchical timing wheel: each level is a ring of SLOTS buckets, a bucket on level L
+# spans SLOTS ** L ticks.  A timer sits in the bucket of the coarsest level its deadline
+# needs; when a lower wheel wraps, the matching bucket one level up is emptied back down
+# the levels.  Arming and cancelling are a dict insert / delete, and each tick only
+# touches the buckets that are due, however many timers are armed.
+class TimingWheel:
+    def __init__(self, tick=TICK, slots=SLOTS, levels=LEVELS, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self.started = clock()
+        self.current = 0  # ticks processed so far
+        # every bucket is a dict used as an insertion ordered set of timers
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.spans = [slots ** level for level in range(levels + 1)]
+        self.count = 0
+        self.running = False
+
+    def schedule(self, delay, callback, *args):
+        ticks = max(1, math.ceil(delay / self.tick))
+        timer = WheelTimer(self.current + ticks, callback, args)
+        self._place(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer):
+        if timer is not None and timer.bucket is not None:
+            del timer.bucket[timer]
+            timer.bucket = None
+            self.count -= 1
+
+    # Seconds until the timer fires (0 if it already has)
+    def remaining(self, timer):
+        return max(0.0, (timer.deadline - self.current) * self.tick) if timer.bucket is not None else 0.0
+
+    def _place(self, timer):
+        remaining = timer.deadline - self.current
+        level = 0
+        while level < self.levels - 1 and remaining >= self.spans[level + 1]:
+            level += 1
+        bucket = self.wheels[level][(timer.deadline // self.spans[level]) % self.slots]
+        bucket[timer] = None
+        timer.bucket = bucket
+
+    # Processes every tick up to now, firing the timers that came due; returns how many fired
+    def advance(self):
+        target = int((self.clock() - self.started) / self.tick)
+        fired = 0
+        while self.current < target:
+            self.current += 1
+            # refill from the top down so a timer can fall several levels in one tick
+            for level in range(self.levels - 1, 0, -1):
+                if self.current % self.spans[level] == 0:
+                    index = (self.current // self.spans[level]) % self.slots
+                    bucket = self.wheels[level][index]
+                    self.wheels[level][index] = {}
+                    for timer in bucket:
+                        self._place(timer)
+
+            index = self.current % self.slots
+            due = self.wheels[0][index]
+            self.wheels[0][index] = {}
+            for timer in due:
+                timer.bucket = None
+                self.count -= 1
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    # one table's bad timeout must not stop every other table's clock
+                    traceback.print_exc()
+                fired += 1
+        return fired
+
+    # Starts the background task that turns the wheel, once; start_task and sleep are
+    # socketio.start_background_task and socketio.sleep in the server
+    def start(self, start_task, sleep):
+        if not self.running:
+            self.running = True
+            start_task(self._run, sleep)
+
+    def _run(self, sleep):
+        while True:
+            self.advance()
+            sleep(self.tick)
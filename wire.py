@@ -0,0 +1,122 @@
+"""
+CS 3050 Poker Game - wire.py
+Sam Whitcomb, Jonah Harris, Owen Davis, Jake Pappas
+
+How events are encoded for each client.  The server keeps cards as integer codes
+(see rankings.encode_card); on the wire they are either
+  * "json": the original format, cards spelled out as "10 of Hearts"
+  * "msgpack": one binary blob, cards left as codes and dict keys / event names
+    replaced by the short ids below
+The client offers the encodings it can read in set_name and the server picks one.
+"""
+
+import json
+
+import deck
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, everyone falls back to JSON
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Short ids, append only: both ends index into these lists
+EVENTS = [
+    "game_state", "game_state_delta", "hand", "community_cards", "reveal_hands",
+    "bet_message", "your_turn", "available_actions", "round_started", "showdown",
+    "message", "player_list", "equity", "time_bank",
+]
+FIELDS = [
+    "players", "uuid", "name", "chips", "folded", "hand_rank", "contribution",
+    "community_cards", "pot", "current_bet", "street", "current_turn", "version",
+    "base", "changes", "removed_players", "hands", "actions", "message", "pots",
+    "amount", "winners", "payouts", "equity", "win", "tie", "samples", "exact",
+    "seat_position", "money_count", "ready", "hand", "seat_position_flag",
+    "seconds", "time_bank",
+]
+EVENT_IDS = {name: i for i, name in enumerate(EVENTS)}
+FIELD_IDS = {name: i for i, name in enumerate(FIELDS)}
+
+
+def supported():
+    return [MSGPACK, JSON] if msgpack is not None else [JSON]
+
+
+# First encoding the client offered that this side can speak, JSON otherwise
+def negotiate(offered):
+    for encoding in offered or ():
+        if encoding in supported():
+            return encoding
+    return JSON
+
+
+# -------------------- Cards --------------------
+# Applies convert to every card list in an event's payload, leaving the rest as is
+def map_cards(event, data, convert):
+    if event in ("hand", "community_cards"):
+        return convert(data)
+    if event == "reveal_hands":
+        return dict(data, hands={seat: convert(cards) for seat, cards in data["hands"].items()})
+    if event == "game_state" and "community_cards" in data:
+        return dict(data, community_cards=convert(data["community_cards"]))
+    if event == "game_state_delta" and "community_cards" in data["changes"]:
+        changes = dict(data["changes"], community_cards=convert(data["changes"]["community_cards"]))
+        return dict(data, changes=changes)
+    return data
+
+
+# -------------------- Keys --------------------
+# Only string keys are shortened, any other key is turned into a string first (the same
+# thing JSON does), so an integer key on the wire is always a field id
+def _compact(value):
+    if isinstance(value, dict):
+        return {FIELD_IDS.get(key, key) if isinstance(key, str) else str(key): _compact(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(item) for item in value]
+    return value
+
+
+def _expand(value):
+    if isinstance(value, dict):
+        return {FIELDS[key] if isinstance(key, int) else key: _expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+
+# -------------------- Events --------------------
+def encode_event(event, data, encoding=JSON):
+    if encoding == MSGPACK:
+        return msgpack.packb(_compact(data))
+    return map_cards(event, data, deck.card_names)
+
+
+# Cards come back as codes from msgpack and as names from JSON
+def decode_event(data):
+    if isinstance(data, (bytes, bytearray)):
+        return _expand(msgpack.unpackb(data, strict_map_key=False))
+    return data
+
+
+# A frame is the list of [event, data] pairs one transition produced for one player
+def encode_frame(events, encoding=JSON):
+    if encoding == MSGPACK:
+        return msgpack.packb([[EVENT_IDS.get(event, event), _compact(data)] for event, data in events])
+    return {"events": [[event, map_cards(event, data, deck.card_names)] for event, data in events]}
+
+
+# Bytes one event takes up inside a frame, for the per-event metrics
+def event_size(event, data, encoding=JSON):
+    if encoding == MSGPACK:
+        return len(msgpack.packb([EVENT_IDS.get(event, event), _compact(data)]))
+    return len(json.dumps([event, map_cards(event, data, deck.card_names)], separators=(",", ":")))
+
+
+def decode_frame(frame):
+    if isinstance(frame, (bytes, bytearray)):
+        return [[EVENTS[event] if isinstance(event, int) else event, _expand(data)]
+                for event, data in msgpack.unpackb(frame, strict_map_key=False)]
+    return frame.get("events", [])